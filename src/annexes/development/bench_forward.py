@@ -0,0 +1,89 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+"""
+Test de non-régression de la lecture des messages transférés (importation.parse_forwarded).
+
+Compare la lecture ligne à ligne à l'ancienne expression régulière sur des transferts bien
+formés, puis mesure le temps de traitement d'entrées pathologiques de taille croissante.
+L'ancienne expression, dont le groupe '(?P<date>.+)+' et le corps '((.)*\\s*)*' imbriquent des
+quantificateurs, explose exponentiellement: elle n'est mesurée que tant qu'un essai reste sous
+la demi-seconde. Le temps de lecture de l'entête doit rester borné quelle que soit la taille de
+l'entrée, seule la copie du corps dans le message reste proportionnelle à sa taille.
+
+utilisation: python -m src.annexes.development.bench_forward
+"""
+import re
+import time
+from src.modules import importation
+
+ANCIEN_PATTERN = re.compile(r"\s*(De|From)\s:\s.+<(?P<sender>.+)>\s*Date\s*:(?P<date>.+)+\s*"
+                            r"Subject\s*:\s*(?P<subject>.+)\s*To:\s*.+\s*(?P<body>((.)*\s*)*)")
+
+TRANSFERTS = [
+    "De : Jean Dupont <jean.dupont@example.fr>\nDate : lun. 3 juin 2024 à 10:12\n"
+    "Subject : Votre colis\nTo: <moi@example.fr>\n\nBonjour,\nvotre colis est arrivé.\n",
+    "\n\nFrom : Support <support@bank.example.com>\nDate : Mon, 3 Jun 2024 10:12:00 +0200\n"
+    "Subject : Verify your account\nTo: victim@example.org\n\n  Click here now\n\nThanks\n",
+    "De : \"Service client\" <client@shop.example.net>\r\nDate : 12/05/2023\r\n"
+    "Subject : Remboursement\r\nTo: a@b.fr\r\nMerci de confirmer vos coordonnées\r\n",
+]
+
+PATHOLOGIQUES = {
+    'date': lambda n: "De : a <b@c.d>\nDate : " + "x" * n + "\n",
+    'chevrons': lambda n: "De : " + "<" * n + "\nDate : x\n",
+    'espaces': lambda n: "From : " + " " * n,
+    'lignes': lambda n: "De : a <b@c.d>\nDate : x\nSubject : s\nTo: t\n" + "a \n" * n,
+}
+
+
+def ancien(body):
+    """
+    Lecture par l'ancienne expression régulière
+    :param body: <str>
+    :return: <dict|None>
+    """
+    if result := ANCIEN_PATTERN.search(body):
+        return result.groupdict()
+    return None
+
+
+def duree(fonction, texte):
+    """
+    Temps de traitement d'un texte
+    :param fonction: <function>
+    :param texte: <str>
+    :return: <float> secondes
+    """
+    debut = time.perf_counter()
+    fonction(texte)
+    return time.perf_counter() - debut
+
+
+if __name__ == '__main__':
+    differences = 0
+    for transfert in TRANSFERTS:
+        reference = ancien(transfert)
+        resultat = importation.parse_forwarded(transfert)
+        if resultat is None or reference['sender'] != resultat['From'] or \
+                reference['date'].strip() != resultat['Date'] or \
+                reference['subject'].strip() != resultat['Subject'] or \
+                reference['body'] != resultat['body']:
+            differences += 1
+            print(f"\t{reference}\n\t{resultat}")
+    print(f"-- Transferts bien formés: {len(TRANSFERTS)} - différences {differences}")
+
+    for nom, generateur in PATHOLOGIQUES.items():
+        print(f"-- Entrée pathologique '{nom}'")
+        lent = False
+        for taille in (10, 15, 20, 22, 24, 1000, 10_000, 100_000, 10_000_000):
+            texte = generateur(taille)
+            t_ancien = '-'
+            if not lent and taille <= 10_000:
+                t_ancien = duree(ancien, texte)
+                lent = t_ancien > 0.5
+                t_ancien = f"{t_ancien * 1000:.2f} ms"
+            t_lecture = duree(importation.parse_forwarded, texte)
+            t_total = duree(importation.format_forwarded, texte)
+            print(f"\t{taille}\tancien {t_ancien}\tlecture {t_lecture * 1000:.2f} ms"
+                  f"\tavec le corps {t_total * 1000:.2f} ms")
@@ -0,0 +1,55 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+"""
+Micro-benchmark de l'extraction du texte des parties html (nettoyage.clear_html).
+
+Compare l'extraction au fil des évènements du parseur lxml à BeautifulSoup et vérifie que les
+textes sont identiques, le hash du texte nettoyé étant l'identifiant des documents en base.
+
+utilisation: python -m src.annexes.development.bench_html [<dossier> ...]
+Sans dossier, des spams html volumineux sont générés.
+"""
+import sys
+import time
+import random
+from src.modules import importation
+from src.modules import nettoyage
+from src.annexes.development.bench_nettoyage import spam_html, mesure
+
+
+def parties_html(fichier):
+    """
+    Récupère les parties html décodées d'un mail
+    :param fichier: <str>
+    :return: <list> de <str>
+    """
+    parties = []
+    for partie in importation.load_mail(fichier).walk():
+        if partie.get_content_type() == 'text/html':
+            parties.append(partie.get_payload(decode=True).decode(errors='ignore'))
+    return parties
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        pages = []
+        for dossier in sys.argv[1:]:
+            for fichier in importation.get_files(dossier):
+                pages += parties_html(fichier)
+    else:
+        alea = random.Random(0)
+        pages = [spam_html(alea, taille) for taille in (1, 10, 100, 1000) for _ in range(20)]
+
+    volume = sum(len(page) for page in pages)
+    print(f"-- {len(pages)} pages html, {volume} caractères")
+
+    differences = [i for i, page in enumerate(pages)
+                   if nettoyage.clear_html(page) != nettoyage.clear_html_soup(page)]
+    print(f"-- Textes différents: {len(differences)}")
+
+    t_soup = mesure(nettoyage.clear_html_soup, pages)
+    t_lxml = mesure(nettoyage.clear_html, pages)
+    print(f"-- BeautifulSoup: {t_soup * 1000:.1f} ms - {volume / t_soup / 1e6:.2f} Mo/s")
+    print(f"-- Evènements lxml: {t_lxml * 1000:.1f} ms - {volume / t_lxml / 1e6:.2f} Mo/s"
+          f" - {t_lxml / t_soup:.1%} du temps")
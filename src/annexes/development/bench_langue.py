@@ -0,0 +1,81 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+"""
+Comparaison de la détection de langue par n-grammes (src.modules.langue) avec langdetect.
+
+Les messages des dossiers passés en argument sont nettoyés comme dans la fouille puis chaque
+méthode détecte leur langue. Le script affiche les débits et les messages dont la langue diffère.
+
+utilisation: python -m src.annexes.development.bench_langue <dossier> [<dossier> ...]
+
+langdetect tire au hasard au plus 7000 n-grammes du texte pour approcher le score bayésien que
+le module calcule exactement: les rares désaccords portent sur des textes courts ou mélangés où
+langdetect lui-même change d'avis d'une graine à l'autre.
+"""
+import sys
+import time
+import langdetect
+from src.modules import importation
+from src.modules import langue
+from src.modules import nettoyage
+
+
+if __name__ == '__main__':
+    print("-- Préparation des messages...", end=' ')
+    bodies = []
+    for dossier in sys.argv[1:]:
+        for fichier in importation.get_files(dossier):
+            body = importation.extract_mail_body(importation.load_mail(fichier))
+            body, _ = nettoyage.clear_texte_init(body)
+            if body:
+                bodies.append(body)
+    print(f"{len(bodies)} messages, {sum(len(b) for b in bodies)} caractères")
+
+    print("-- langdetect...", end=' ')
+    debut = time.perf_counter()
+    reference = []
+    for body in bodies:
+        try:
+            reference.append(langdetect.detect(body).split()[0])
+        except langdetect.lang_detect_exception.LangDetectException:
+            reference.append(None)
+    t_ref = time.perf_counter() - debut
+    print(f"{t_ref:.2f}s - {len(bodies) / t_ref:.0f} messages/s")
+
+    print("-- langdetect graine fixée...", end=' ')
+    debut = time.perf_counter()
+    reference_fixe = [langue.detecter_langdetect(body) for body in bodies]
+    t_fixe = time.perf_counter() - debut
+    print(f"{t_fixe:.2f}s - {len(bodies) / t_fixe:.0f} messages/s")
+
+    print("-- n-grammes unitaire...", end=' ')
+    langue.get_modele()
+    debut = time.perf_counter()
+    unitaire = [langue.detecter(body) for body in bodies]
+    t_unit = time.perf_counter() - debut
+    print(f"{t_unit:.2f}s - {len(bodies) / t_unit:.0f} messages/s - x{t_ref / t_unit:.1f}")
+
+    for taille in (100, 1000):
+        print(f"-- n-grammes par lots de {taille}...", end=' ')
+        debut = time.perf_counter()
+        lot = []
+        for i in range(0, len(bodies), taille):
+            lot += langue.detecter_lot(bodies[i:i + taille])
+        t_lot = time.perf_counter() - debut
+        print(f"{t_lot:.2f}s - {len(bodies) / t_lot:.0f} messages/s - x{t_ref / t_lot:.1f}")
+
+    for prefixe in (500, 2000):
+        print(f"-- n-grammes préfixe de {prefixe} caractères...", end=' ')
+        debut = time.perf_counter()
+        court = langue.detecter_lot(bodies, prefixe)
+        t_court = time.perf_counter() - debut
+        accord = sum(a == b for a, b in zip(court, unitaire)) / len(bodies)
+        print(f"{t_court:.2f}s - x{t_ref / t_court:.1f} - accord {accord:.2%}")
+
+    assert lot == unitaire, "Les résultats par lots diffèrent des résultats unitaires"
+    differences = [(i, ref, fixe, res) for i, (ref, fixe, res)
+                   in enumerate(zip(reference, reference_fixe, unitaire)) if res != ref]
+    print(f"-- Accord avec langdetect: {1 - len(differences) / len(bodies):.2%}")
+    for i, ref, fixe, res in differences:
+        print(f"\t{ref} / graine fixée {fixe} / n-grammes {res}\t{bodies[i][:80]!r}")
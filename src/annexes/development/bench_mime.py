@@ -0,0 +1,94 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+"""
+Comparaison de la lecture des parties textes (importation.load_mail_texte) avec la lecture
+complète des mails par le parseur email (message_from_bytes puis extract_mail_body).
+
+Vérifie que corps et métadonnées sont identiques, le hash du corps nettoyé étant l'identifiant
+des documents en base, puis mesure les débits.
+
+utilisation: python -m src.annexes.development.bench_mime [<dossier> ...]
+Sans dossier, des mails avec de volumineuses pièces jointes base64 sont générés.
+"""
+import sys
+import time
+import email
+import random
+from email.mime.application import MIMEApplication
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from src.modules import importation
+from src.annexes.development.bench_nettoyage import spam_html
+
+
+def reference(raw):
+    """
+    Lecture complète par le parseur email
+    :param raw: <bytes>
+    :return: <tuple> (<Message>, <str>)
+    """
+    mail = email.message_from_bytes(raw)
+    return mail, importation.extract_mail_body(mail)
+
+
+def mail_joint(alea, taille):
+    """
+    Génère un mail html accompagné de pièces jointes binaires
+    :param alea: <random.Random>
+    :param taille: <int> taille totale des pièces jointes en octets
+    :return: <bytes>
+    """
+    mail = MIMEMultipart('mixed')
+    mail['Subject'] = "Facture"
+    mail['From'] = "facturation@example.org"
+    corps = MIMEMultipart('alternative')
+    corps.attach(MIMEText("Veuillez trouver ci-joint votre facture.\n", 'plain', 'utf-8'))
+    corps.attach(MIMEText(spam_html(alea, 20), 'html', 'utf-8'))
+    mail.attach(corps)
+    for _ in range(3):
+        mail.attach(MIMEApplication(alea.randbytes(taille // 3), 'pdf'))
+    return mail.as_bytes()
+
+
+def mesure(fonction, mails, repetitions=3):
+    """
+    Temps moyen de lecture d'une liste de mails
+    :param fonction: <function>
+    :param mails: <list> de <bytes>
+    :param repetitions: <int>
+    :return: <float> secondes
+    """
+    debut = time.perf_counter()
+    for _ in range(repetitions):
+        for raw in mails:
+            fonction(raw)
+    return (time.perf_counter() - debut) / repetitions
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        mails = [importation.get_raw_file(fichier) for dossier in sys.argv[1:]
+                 for fichier in importation.get_files(dossier)]
+    else:
+        alea = random.Random(0)
+        mails = [mail_joint(alea, taille)
+                 for taille in (10_000, 1_000_000, 20_000_000) for _ in range(3)]
+
+    volume = sum(len(raw) for raw in mails)
+    print(f"-- {len(mails)} mails, {volume / 1e6:.1f} Mo")
+
+    differences = 0
+    for raw in mails:
+        mail, body = reference(raw)
+        entete, texte = importation.load_mail_texte(raw)
+        if body != texte or importation.extract_mail_meta(mail) != \
+                importation.extract_mail_meta(entete):
+            differences += 1
+    print(f"-- Résultats différents: {differences}")
+
+    t_ref = mesure(reference, mails)
+    t_new = mesure(importation.load_mail_texte, mails)
+    print(f"-- Parseur email: {t_ref * 1000:.1f} ms - {volume / t_ref / 1e6:.1f} Mo/s")
+    print(f"-- Parties textes: {t_new * 1000:.1f} ms - {volume / t_new / 1e6:.1f} Mo/s"
+          f" - x{t_ref / t_new:.1f}")
@@ -0,0 +1,130 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+"""
+Micro-benchmark du nettoyage initial des messages (nettoyage.clear_texte_init).
+
+Compare le moteur de passes (NETTOYAGE) à l'enchaînement de référence clear_reply,
+change_lien, change_nombres, clear_ponctuation et vérifie que textes et compteurs de liens sont
+identiques, le hash du texte nettoyé étant l'identifiant des documents en base.
+
+utilisation: python -m src.annexes.development.bench_nettoyage [<dossier> ...]
+Sans dossier, des spams html volumineux sont générés.
+
+Un balayage unique par une alternative de groupes nommés ne donne pas le même résultat que les
+passes successives: chaque passe travaille sur le texte déjà nettoyé par les précédentes (un mail
+supprimé peut coller deux mots en une url, un prix supprimé avant les nombres...). Il est aussi
+plus lent: une alternative testée à chaque position coûte plus cher que des subn spécialisés.
+"""
+import sys
+import time
+import random
+from src.modules import importation
+from src.modules import nettoyage
+
+MOTS = ("free offer click here now win prize money bank account verify your password limited "
+        "time only best price guaranteed unsubscribe café été naïve").split()
+
+
+def reference(texte):
+    """
+    Nettoyage initial par les fonctions unitaires
+    :param texte: <str>
+    :return: <tuple> (<str>, <dict>)
+    """
+    liens = {'URL': 0, 'MAIL': 0, 'TEL': 0, 'NOMBRE': 0, 'PRIX': 0}
+    temp = nettoyage.clear_reply(texte)
+    temp = nettoyage.change_lien(temp, liens)
+    temp = nettoyage.change_nombres(temp, liens)
+    temp = nettoyage.clear_ponctuation(temp)
+    return temp, liens
+
+
+def spam_html(alea, taille):
+    """
+    Génère un spam html
+    :param alea: <random.Random>
+    :param taille: <int> nombre de paragraphes
+    :return: <str>
+    """
+    elements = []
+    for _ in range(taille):
+        mots = []
+        for _ in range(alea.randint(5, 40)):
+            tirage = alea.random()
+            if tirage < 0.03:
+                mots.append(f'<a href="http://www.site{alea.randint(1, 99)}.com/p?id='
+                            f'{alea.randint(1, 9999)}">http://www.site{alea.randint(1, 99)}.com/'
+                            f'p?id={alea.randint(1, 9999)}&amp;u=x</a>')
+            elif tirage < 0.05:
+                mots.append(f"www.promo{alea.randint(1, 9)}.net")
+            elif tirage < 0.06:
+                mots.append(f"user{alea.randint(1, 99)}@mail.example.org")
+            elif tirage < 0.08:
+                mots.append(f"<b>${alea.randint(1, 999)}.99</b> ")
+            elif tirage < 0.09:
+                mots.append(f" {alea.randint(1, 999)}€")
+            elif tirage < 0.10:
+                mots.append(f"+33 6 {alea.randint(10, 99)} {alea.randint(10, 99)} 00")
+            elif tirage < 0.11:
+                mots.append(f"({alea.randint(100, 999)}){alea.randint(1000, 9999)}-"
+                            f"{alea.randint(1000, 9999)}")
+            elif tirage < 0.16:
+                mots.append(str(alea.randint(0, 100000)))
+            elif tirage < 0.23:
+                mots.append(alea.choice("*#-_=:;[]\"~)(|/$+}{@%&\\!?.,"))
+            else:
+                mots.append(alea.choice(MOTS))
+        elements.append(f"<p style=\"color:red\">{' '.join(mots)}</p>")
+        if alea.random() < 0.1:
+            elements.append(f"<br>\n> {alea.choice(MOTS)} {alea.choice(MOTS)}<br>\n")
+    return (f"<html><head><style>p {{color: red}}</style></head><body>{''.join(elements)}"
+            f"<script>var x = 1;</script></body></html>")
+
+
+def mesure(fonction, textes, repetitions=5):
+    """
+    Temps moyen de traitement d'une liste de textes
+    :param fonction: <function>
+    :param textes: <list>
+    :param repetitions: <int>
+    :return: <float> secondes
+    """
+    debut = time.perf_counter()
+    for _ in range(repetitions):
+        for texte in textes:
+            fonction(texte)
+    return (time.perf_counter() - debut) / repetitions
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        textes = []
+        for dossier in sys.argv[1:]:
+            for fichier in importation.get_files(dossier):
+                textes.append(importation.extract_mail_body(importation.load_mail(fichier)))
+    else:
+        alea = random.Random(0)
+        textes = [nettoyage.clear_html(spam_html(alea, taille))
+                  for taille in (10, 100, 1000, 5000) for _ in range(5)]
+
+    volume = sum(len(texte) for texte in textes)
+    print(f"-- {len(textes)} textes, {volume} caractères")
+
+    differences = [i for i, texte in enumerate(textes)
+                   if nettoyage.clear_texte_init(texte) != reference(texte)]
+    print(f"-- Résultats différents: {len(differences)}")
+
+    t_ref = mesure(reference, textes)
+    t_new = mesure(nettoyage.clear_texte_init, textes)
+    print(f"-- Référence: {t_ref * 1000:.1f} ms - {volume / t_ref / 1e6:.2f} Mo/s")
+    print(f"-- Passes NETTOYAGE: {t_new * 1000:.1f} ms - {volume / t_new / 1e6:.2f} Mo/s"
+          f" - x{t_ref / t_new:.2f}")
+
+    print("-- Détail par passe")
+    temp = textes[:]
+    for categorie, pattern, _ in nettoyage.NETTOYAGE:
+        debut = time.perf_counter()
+        temp = [pattern.subn('', texte)[0] for texte in temp]
+        print(f"\t{categorie or '-'}\t{pattern.pattern[:40]!r}\t"
+              f"{(time.perf_counter() - debut) * 1000:.1f} ms")
@@ -0,0 +1,88 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+"""
+Comparaison de l'ajustement vectorisé de la distribution de zipf (zipf.zipf_frequences) avec
+l'ancien calcul par listes, un coefficient après l'autre.
+
+Vérifie que constante, coefficient et couts sont identiques à la tolérance flottante près, puis
+mesure les temps sur des textes de la taille d'un mail et sur un vocabulaire de corpus.
+
+utilisation: python -m src.annexes.development.bench_zipf
+"""
+import random
+import time
+import numpy as np
+from src.annexes import zipf
+
+
+def ancien(frequences):
+    """
+    Ancien ajustement: 44 listes de fréquences théoriques et 44 appels à cout
+    :param frequences: <dict> {<str> mot: <int> fréquence}
+    :return: <dict>
+    """
+    classement = zipf.classement_zipf(frequences)
+    rang, freq_reel = zip(*[(e['rang'], e['frequence']) for e in classement])
+    const_moy = np.mean([e['rang'] * e['frequence'] for e in classement])
+    coefs = list(np.arange(0.86, 1.3, 0.01))
+    freq_theorique = {coef: [zipf.zipf_freq_theorique(const_moy, rg, coef) for rg in rang]
+                      for coef in coefs}
+    cout_p_coef = {coef: zipf.cout(freq_reel, freq_theorique[coef], 'absolue')
+                   for coef in coefs}
+    cout_min = min(cout_p_coef.values())
+    coef_min = list(cout_p_coef.keys())[list(cout_p_coef.values()).index(cout_min)]
+    return {'const_moy': const_moy, 'cout_min': cout_min, 'coef_min': coef_min,
+            'cout_p_coef': cout_p_coef}
+
+
+def texte(alea, mots):
+    """
+    Génère des fréquences de mots suivant une loi de puissance
+    :param alea: <random.Random>
+    :param mots: <int> nombre de mots du texte
+    :return: <dict>
+    """
+    exposant = alea.uniform(0.5, 2)
+    return zipf.freq_mot([str(int(alea.paretovariate(exposant))) for _ in range(mots)])
+
+
+def mesure(fonction, textes):
+    """
+    Temps moyen d'ajustement d'un texte
+    :param fonction: <function>
+    :param textes: <list> de <dict>
+    :return: <float> secondes
+    """
+    debut = time.perf_counter()
+    for frequences in textes:
+        fonction(frequences)
+    return (time.perf_counter() - debut) / len(textes)
+
+
+if __name__ == '__main__':
+    alea = random.Random(0)
+    textes = [texte(alea, mots) for mots in (20, 100, 300, 1000) for _ in range(50)]
+
+    differences = 0
+    for frequences in textes:
+        reference = ancien(frequences)
+        resultat = zipf.zipf_frequences(frequences)
+        if reference['const_moy'] != resultat['const_moy'] or \
+                reference['coef_min'] != resultat['coef_min'] or \
+                not np.allclose(list(reference['cout_p_coef'].values()),
+                                list(resultat['cout_p_coef'].values()), rtol=1e-12):
+            differences += 1
+    print(f"-- {len(textes)} textes - différences {differences}")
+
+    t_ancien = mesure(ancien, textes)
+    t_complet = mesure(zipf.zipf_frequences, textes)
+    t_resume = mesure(lambda frequences: zipf.zipf_frequences(frequences, resume=True), textes)
+    print(f"-- Ancien: {t_ancien * 1000:.2f} ms/texte")
+    print(f"-- Vectorisé: {t_complet * 1000:.2f} ms/texte - x{t_ancien / t_complet:.1f}")
+    print(f"-- Vectorisé, résumé: {t_resume * 1000:.2f} ms/texte - x{t_ancien / t_resume:.1f}")
+
+    vocabulaire = {str(rang): int(1e7 / rang) + 1 for rang in range(1, 1_000_001)}
+    t_corpus = mesure(lambda frequences: zipf.zipf_frequences(frequences, resume=True),
+                      [vocabulaire])
+    print(f"-- Vocabulaire de {len(vocabulaire)} mots: {t_corpus:.2f} s")
@@ -4,10 +4,15 @@ Code utilisé pour l'exploitation de la distribution de Zipf
 """
 
 import logging
+from itertools import chain
 import numpy as np
 
 logger = logging.getLogger(__name__)
 
+COEFS = np.arange(0.86, 1.3, 0.01)
+BLOC_RANGS = 65536
+RANGS_LOT = 1024
+
 
 def freq_mot(bag, freq=None):
     """
@@ -68,7 +73,7 @@ def classement_zipf(dico):
     return ranked
 
 
-def zipf_process(bag):
+def zipf_process(bag, resume=False):
     """
     Récupère une liste de mot et applique les traitements pour l'analyse de la distribution de zipf
     1. calcul de la fréquence
@@ -77,35 +82,122 @@ def zipf_process(bag):
     4. calculer la fréquence théorique moyenne
     5. déterminer le coefficient avec le cout absolu moyen le plus bas
     :param bag: <list> liste de <str>
+    :param resume: <bool> ne renvoie que la constante, le coefficient et son cout
+    :return: <dict>
+    """
+    return zipf_frequences(freq_mot(bag), resume)
+
+
+def zipf_frequences(frequences, resume=False):
+    """
+    Analyse de la distribution de zipf à partir des fréquences des mots.
+    Les fréquences théoriques de tous les coefficients sont calculées en une opération sur un
+    tableau coefficients x rangs, par blocs de rangs pour borner la mémoire sur un vocabulaire
+    de corpus.
+    :param frequences: <dict> {<str> mot: <int> fréquence}
+    :param resume: <bool> ne renvoie que la constante, le coefficient et son cout
     :return: <dict>
     """
-    # Trie du sac de mot
-    classement = classement_zipf(freq_mot(bag))
-    rang, freq_reel = zip(*[(e['rang'], e['frequence']) for e in classement])
+    if not frequences:
+        raise ValueError("Distribution de zipf - aucun mot")
+
+    # Trie des fréquences
+    freq_reel = np.sort(np.fromiter(frequences.values(), dtype=np.int64, count=len(frequences)))
+    freq_reel = freq_reel[::-1]
+    rang = np.arange(1, len(freq_reel) + 1)
 
     # Déterminer la constante moyenne
-    const_moy = np.mean([e['rang'] * e['frequence'] for e in classement])
+    const_moy = np.mean(rang * freq_reel)
 
     # Déterminer le coefficient avec le cout minimum
-    coefs = list(np.arange(0.86, 1.3, 0.01))
-    freq_theorique = {coef: [zipf_freq_theorique(const_moy, rg, coef) for rg in rang]
-                      for coef in coefs}
-    cout_p_coef = {coef: cout(freq_reel, freq_theorique[coef], 'absolue')
-                   for coef in coefs}
-    cout_min = min(cout_p_coef.values())
-    coef_min = list(cout_p_coef.keys())[list(cout_p_coef.values()).index(cout_min)]
+    ecarts = np.zeros(len(COEFS))
+    for debut in range(0, len(rang), BLOC_RANGS):
+        bloc = slice(debut, debut + BLOC_RANGS)
+        theorique = const_moy / rang[bloc] ** COEFS[:, np.newaxis]
+        ecarts += np.abs(freq_reel[bloc] - theorique).sum(axis=1)
+    couts = ecarts / len(rang)
+    index_min = int(np.argmin(couts))
+    coef_min = COEFS[index_min]
+    cout_min = couts[index_min]
+
+    if resume:
+        return {
+            'const_moy': const_moy,
+            'cout_min': cout_min,
+            'coef_min': coef_min
+        }
 
     return {
         'const_moy': const_moy,
         'cout_min': cout_min,
         'coef_min': coef_min,
-        'rang': rang,
-        'freq_reel': freq_reel,
-        'cout_p_coef': cout_p_coef,
-        'freq_theorique': freq_theorique[coef_min]
+        'rang': tuple(rang.tolist()),
+        'freq_reel': tuple(freq_reel.tolist()),
+        'cout_p_coef': dict(zip(COEFS, couts)),
+        'freq_theorique': (const_moy / rang ** coef_min).tolist()
     }
 
 
+def zipf_lot(frequences):
+    """
+    Analyse de la distribution de zipf de plusieurs textes.
+    Les fréquences triées de tous les textes sont mises bout à bout: constantes, fréquences
+    théoriques et couts sont calculés par groupes de textes d'au plus RANGS_LOT rangs, pour
+    rester en cache, les sommes de chaque texte étant réduites par np.add.reduceat. Les
+    puissances rang ** coef sont calculées une seule fois par rang. Un texte de plus de
+    BLOC_RANGS mots distincts est ajusté seul par zipf_frequences.
+    :param frequences: <list> de <dict> {<str> mot: <int> fréquence}, aucun vide
+    :return: <tuple> (<np.ndarray> constantes, <np.ndarray> coefficients, <np.ndarray> couts)
+    """
+    tailles = np.fromiter((len(freq) for freq in frequences), dtype=np.int64,
+                          count=len(frequences))
+    if not tailles.all():
+        raise ValueError("Distribution de zipf - aucun mot")
+
+    # Tri des fréquences de chaque texte
+    valeurs = np.fromiter(chain.from_iterable(freq.values() for freq in frequences),
+                          dtype=np.int64, count=int(tailles.sum()))
+    texte = np.repeat(np.arange(len(tailles)), tailles)
+    freq_reel = valeurs[np.lexsort((-valeurs, texte))]
+    debuts = np.concatenate(([0], np.cumsum(tailles)[:-1]))
+    rang = np.arange(len(freq_reel)) - np.repeat(debuts, tailles) + 1
+
+    # Constantes moyennes
+    constantes = np.add.reduceat(rang * freq_reel, debuts) / tailles
+
+    # Coefficients au cout minimum, par groupes de textes
+    rang_max = max((taille for taille in tailles if taille <= BLOC_RANGS), default=0)
+    puissances = np.arange(1, rang_max + 1) ** COEFS[:, np.newaxis]
+    coefficients = np.empty(len(tailles))
+    couts = np.empty(len(tailles))
+    premier = 0
+    while premier < len(tailles):
+        if tailles[premier] > BLOC_RANGS:
+            z_data = zipf_frequences(frequences[premier], resume=True)
+            coefficients[premier] = z_data['coef_min']
+            couts[premier] = z_data['cout_min']
+            premier += 1
+            continue
+
+        dernier = premier + 1
+        while dernier < len(tailles) and \
+                debuts[dernier] + tailles[dernier] - debuts[premier] <= RANGS_LOT:
+            dernier += 1
+        groupe = slice(premier, dernier)
+        bloc = slice(debuts[premier], debuts[dernier - 1] + tailles[dernier - 1])
+
+        theorique = np.repeat(constantes[groupe], tailles[groupe]) / puissances[:, rang[bloc] - 1]
+        ecarts = np.add.reduceat(np.abs(freq_reel[bloc] - theorique),
+                                 debuts[groupe] - debuts[premier], axis=1)
+        couts_groupe = ecarts / tailles[groupe]
+        index_min = np.argmin(couts_groupe, axis=0)
+        coefficients[groupe] = COEFS[index_min]
+        couts[groupe] = couts_groupe[index_min, np.arange(dernier - premier)]
+        premier = dernier
+
+    return constantes, coefficients, couts
+
+
 def zipf_freq_theorique(constante, rang, coef):
     """
     Calcul la fréquence théorique d'un mot selon son rang, la constante du texte et un coefficient
@@ -124,13 +216,22 @@ def hapax(bag):
     :param bag: <list> liste des mots
     :return: <dict> Nombre d'hapax et ratio par rapport à tout le texte et tous les mots
     """
-    classement = classement_zipf(freq_mot(bag))
-    nb_hapax = len([e['mot'] for e in classement if e['frequence'] == 1])
+    return hapax_frequences(freq_mot(bag), len(bag))
+
+
+def hapax_frequences(frequences, mots):
+    """
+    Compte le nombre de mots n'ayant qu'une seule occurrence à partir des fréquences des mots
+    :param frequences: <dict> {<str> mot: <int> fréquence}
+    :param mots: <int> nombre de mots du texte
+    :return: <dict> Nombre d'hapax et ratio par rapport à tout le texte et tous les mots
+    """
+    nb_hapax = sum(1 for frequence in frequences.values() if frequence == 1)
 
     hapax_data = {
         'nombres': nb_hapax,
-        'ratio_mots_uniques': nb_hapax/len(classement),
-        'ratio_texte': nb_hapax/len(bag)
+        'ratio_mots_uniques': nb_hapax/len(frequences),
+        'ratio_texte': nb_hapax/mots
     }
 
     return hapax_data
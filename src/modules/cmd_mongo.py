@@ -117,3 +117,22 @@ def get_all_documents(collection, d_filter=None, include=None, limit=None):
     except pymongo.errors.ServerSelectionTimeoutError as err:
         logger.error(err)
         return []
+
+
+def iter_documents(collection, d_filter=None, include=None, batch_size=1000):
+    """
+    Parcourt les documents d'une collection par lots sans les charger tous en mémoire
+    :param collection: <pymongo_Collection>
+    :param d_filter: <dict>
+    :param include: <list>
+    :param batch_size: <int> nombre de documents par aller-retour avec le serveur
+    :return: <generator> de <dict>
+    """
+    if d_filter is None:
+        d_filter = {}
+    include = {field: 1 for field in include} if isinstance(include, list) else None
+
+    try:
+        yield from collection.find(d_filter, include).batch_size(batch_size)
+    except pymongo.errors.ServerSelectionTimeoutError as err:
+        logger.error(err)
@@ -151,6 +151,38 @@ def insert_data_many(client_psql, table, data):
     return res
 
 
+def upsert_data_many(client_psql, table, data, conflict):
+    """
+    Insère ou met à jour les données sur plusieurs lignes.
+    Les valeurs None sont insérées en NULL. Sans autre colonne que celles de la contrainte, une
+    ligne déjà présente est laissée telle quelle.
+    :param client_psql: <psycopg2.extension.connection> object connexion vers une base de donnee
+    :param table: <str> La table dans à remplir
+    :param data: <list> [{col1 : val1, col2 : val2}, ...]
+    :param conflict: <list> colonnes de la contrainte d'unicité
+    """
+    data = [dict(sorted(line.items())) for line in data]
+    keys = data[0].keys()
+    for line in data[1:]:
+        if keys != line.keys():
+            logger.error("Impossible d'insérer les données dans la table %s les clés entre les"
+                         " lignes ne sont pas identiques", table)
+            return -1
+
+    lines_values = []
+    for line in data:
+        vals = ','.join(['NULL' if v is None else str(v) if not isinstance(v, str)
+                         else f"'{v}'" for v in line.values()])
+        lines_values.append(f"({vals})")
+
+    updates = [f"{key} = EXCLUDED.{key}" for key in keys if key not in conflict]
+    action = f"DO UPDATE SET {', '.join(updates)}" if updates else "DO NOTHING"
+    query = (f"INSERT INTO {table} ({','.join(list(keys))}) VALUES {', '.join(lines_values)} "
+             f"ON CONFLICT ({','.join(conflict)}) {action}")
+    res = exec_query(client_psql, query)
+    return res
+
+
 def get_data(client_psql, table, champs, clause=None):
     """
     Récupère les données de la base.
@@ -214,6 +246,85 @@ def exec_query(client_psql, query):
         return -1
 
 
+def iter_query(client_psql, query, taille=10000):
+    """
+    Execute une query SELECT et parcourt le résultat par lots via un curseur serveur
+    :param client_psql: <psycopg2.extension.connection> object connexion vers une base de donnee
+    :param query: <str> query à appliquer
+    :param taille: <int> nombre de lignes par lot
+    :return: <generator> de <tuple>
+    """
+    cursor = client_psql.cursor(name=f"errol_{id(query)}", withhold=True)
+    cursor.itersize = taille
+    try:
+        cursor.execute(query)
+        yield from cursor
+    except psycopg2.Error as err:
+        logger.error("Erreur d'execution de la requete : %s - %s", err, query)
+    finally:
+        cursor.close()
+
+
+def requete_agregats(source, groupe, champs, clause=None):
+    """
+    Requête des statistiques de plusieurs champs par groupe calculées par la base: moyenne,
+    médiane et 90e percentile (interpolés comme pandas) et maximum.
+    Les champs sont dépliés en lignes (champ, valeur) pour n'écrire chaque agrégat qu'une fois.
+    :param source: <str> clause FROM, tables et jointures
+    :param groupe: <str> expression du groupe, renvoyée dans la colonne groupe
+    :param champs: <dict> {<str> nom: <str> expression}
+    :param clause: <str> Clause WHERE
+    :return: <str> requête des colonnes groupe, champ, mean, q50, q90, max
+    """
+    valeurs = ', '.join(f"('{nom}', ({expression})::float8)" for nom, expression in champs.items())
+    query = (f"SELECT {groupe} AS groupe, champ, AVG(valeur) AS mean, "
+             f"percentile_cont(0.5) WITHIN GROUP (ORDER BY valeur) AS q50, "
+             f"percentile_cont(0.9) WITHIN GROUP (ORDER BY valeur) AS q90, "
+             f"MAX(valeur) AS max "
+             f"FROM {source} CROSS JOIN LATERAL (VALUES {valeurs}) AS v(champ, valeur)")
+    if clause:
+        query += f" WHERE {clause}"
+    return f"{query} GROUP BY groupe, champ"
+
+
+def requete_correlations(source, champs, clause=None):
+    """
+    Requête des coefficients de corrélation de Pearson de chaque couple de champs
+    :param source: <str> clause FROM, tables et jointures
+    :param champs: <dict> {<str> nom: <str> expression}
+    :param clause: <str> Clause WHERE
+    :return: <str> requête d'une ligne, colonnes 'nom1|nom2' pour chaque couple
+    """
+    noms = list(champs)
+    couples = [(nom1, nom2) for index, nom1 in enumerate(noms) for nom2 in noms[index:]]
+    query = "SELECT " + ', '.join(
+        f'corr(({champs[nom1]})::float8, ({champs[nom2]})::float8) AS "{nom1}|{nom2}"'
+        for nom1, nom2 in couples) + f" FROM {source}"
+    if clause:
+        query += f" WHERE {clause}"
+    return query
+
+
+def requete_histogramme(source, champ, groupe, bornes, classes):
+    """
+    Requête d'un histogramme calculé par la base: nombre de lignes par groupe et par classe de
+    même largeur entre les bornes (width_bucket), le maximum étant compté dans la dernière
+    classe comme numpy
+    :param source: <str> clause FROM
+    :param champ: <str> expression
+    :param groupe: <str> expression du groupe, renvoyée dans la colonne groupe
+    :param bornes: <tuple> (<float> minimum, <float> maximum)
+    :param classes: <int> nombre de classes
+    :return: <str> requête des colonnes groupe, classe (de 1 à classes), nombre
+    """
+    minimum, maximum = bornes
+    return (f"SELECT {groupe} AS groupe, "
+            f"LEAST(width_bucket({champ}, {minimum}, {maximum}, {classes}), {classes}) AS classe, "
+            f"COUNT(*) AS nombre FROM {source} "
+            f"WHERE {champ} BETWEEN {minimum} AND {maximum} "
+            f"GROUP BY 1, 2 ORDER BY 1, 2")
+
+
 def update(client, table, data, clause=None):
     """
     Met à jour les données d'une table
@@ -0,0 +1,43 @@
+# coding: utf-8
+"""
+Module pour la gestion des empreintes des messages déjà connus.
+Permet d'écarter les doublons avant tout traitement coûteux.
+"""
+
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def empreinte(hash_hex):
+    """
+    Réduit un hash md5 hexadécimal à une empreinte entière de 64 bits
+    :param hash_hex: <str>
+    :return: <int>
+    """
+    return int(hash_hex[:16], 16)
+
+
+class Empreintes:
+    """
+    Ensemble compact d'empreintes de 64 bits stockées dans un tableau trié.
+    8 octets par message, sans faux positif en pratique (probabilité de collision de l'ordre de
+    n / 2^64), la recherche se fait par dichotomie.
+    Le tableau numpy n'est jamais modifié, il reste partagé entre les processus issus d'un fork.
+    """
+    def __init__(self, hashes):
+        valeurs = np.fromiter((empreinte(hash_hex) for hash_hex in hashes if hash_hex),
+                              dtype=np.uint64)
+        self.valeurs = np.unique(valeurs)
+
+    def __contains__(self, hash_hex):
+        valeur = np.uint64(empreinte(hash_hex))
+        index = np.searchsorted(self.valeurs, valeur)
+        return bool(index < len(self.valeurs) and self.valeurs[index] == valeur)
+
+    def __len__(self):
+        return len(self.valeurs)
+
+    def __repr__(self):
+        return f"<Empreintes: {len(self)}>"
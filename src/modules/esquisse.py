@@ -0,0 +1,172 @@
+# coding: utf-8
+"""
+Module d'esquisses de comptage à mémoire bornée pour les statistiques du vocabulaire.
+
+Les esquisses remplacent les dictionnaires exacts sur les très gros corpus, leur taille ne
+dépend pas du nombre de mots distincts et elles se fusionnent entre processus sans perte:
+- HyperLogLog: nombre de mots distincts, 2^PRECISION registres d'un octet (16 Kio), erreur
+  relative type 1.04 / sqrt(2^PRECISION), soit 0.8 %.
+- TopK: fréquences des mots les plus fréquents par l'algorithme de Misra-Gries (dual du
+  space-saving), au plus 2 * TOPK mots conservés. Chaque fréquence est sous-estimée d'au plus
+  l'écart accumulé, lui-même borné par le nombre total de mots / (TOPK + 1).
+"""
+
+import heapq
+import logging
+from collections import Counter
+from hashlib import blake2b
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+PRECISION = 14
+TOPK = 10000
+
+
+def hash_mot(mot):
+    """
+    Hash de 64 bits d'un mot
+    :param mot: <str>
+    :return: <int>
+    """
+    return int.from_bytes(blake2b(mot.encode('utf-8', 'surrogatepass'), digest_size=8).digest(),
+                          'big')
+
+
+def longueur_bits(valeurs):
+    """
+    Nombre de bits significatifs de chaque entier de 64 bits, calculé sur les deux moitiés de
+    32 bits pour rester exact en flottant
+    :param valeurs: <np.ndarray> uint64
+    :return: <np.ndarray> int
+    """
+    hauts = np.frexp((valeurs >> np.uint64(32)).astype(np.float64))[1]
+    bas = np.frexp((valeurs & np.uint64(0xFFFFFFFF)).astype(np.float64))[1]
+    return np.where(hauts > 0, hauts + 32, bas)
+
+
+class HyperLogLog:
+    """
+    Estimation du nombre d'éléments distincts.
+    Les premiers bits du hash choisissent un registre qui garde le rang maximal du premier bit à
+    1 des bits suivants.
+    """
+    def __init__(self, precision=PRECISION):
+        self.precision = precision
+        self.registres = np.zeros(1 << precision, dtype=np.uint8)
+
+    def update(self, mots):
+        """
+        Ajoute des mots
+        :param mots: <iterable> de <str>
+        """
+        hashes = np.fromiter((hash_mot(mot) for mot in set(mots)), dtype=np.uint64)
+        if hashes.size == 0:
+            return
+        decalage = np.uint64(64 - self.precision)
+        index = (hashes >> decalage).astype(np.intp)
+        reste = hashes << np.uint64(self.precision)
+        rangs = (64 - longueur_bits(reste) + 1).clip(max=64 - self.precision + 1)
+        np.maximum.at(self.registres, index, rangs.astype(np.uint8))
+
+    def fusion(self, autre):
+        """
+        Fusionne une autre esquisse de même précision
+        :param autre: <HyperLogLog>
+        """
+        np.maximum(self.registres, autre.registres, out=self.registres)
+
+    def cardinalite(self):
+        """
+        Nombre estimé d'éléments distincts, corrigé par comptage linéaire pour les petits
+        ensembles
+        :return: <int>
+        """
+        taille = len(self.registres)
+        alpha = 0.7213 / (1 + 1.079 / taille)
+        estimation = alpha * taille ** 2 / np.sum(np.ldexp(1.0, -self.registres.astype(int)))
+        vides = int(np.count_nonzero(self.registres == 0))
+        if estimation <= 2.5 * taille and vides:
+            estimation = taille * np.log(taille / vides)
+        return int(round(estimation))
+
+
+class TopK:
+    """
+    Fréquences approchées des mots les plus fréquents (Misra-Gries).
+    Quand plus de 2 * k mots sont suivis, la (k + 1)ème fréquence est retranchée à tous et les
+    mots tombés à zéro sont oubliés. La fusion de deux esquisses suivie de la même réduction
+    conserve la borne d'erreur.
+    """
+    def __init__(self, k=TOPK):
+        self.k = k
+        self.compteur = Counter()
+        self.total = 0
+        self.ecart = 0
+
+    def update(self, mots):
+        """
+        Ajoute des mots ou fusionne une autre esquisse
+        :param mots: <list|TopK>
+        """
+        if isinstance(mots, TopK):
+            self.compteur.update(mots.compteur)
+            self.total += mots.total
+            self.ecart += mots.ecart
+        else:
+            self.compteur.update(mots)
+            self.total += len(mots)
+
+        if len(self.compteur) > 2 * self.k:
+            self.reduire()
+
+    def reduire(self):
+        """
+        Ramène l'esquisse à au plus k mots
+        """
+        seuil = heapq.nlargest(self.k + 1, self.compteur.values())[-1]
+        self.compteur = Counter({mot: nombre - seuil for mot, nombre in self.compteur.items()
+                                 if nombre > seuil})
+        self.ecart += seuil
+
+    def frequences(self):
+        """
+        Fréquences estimées des k mots les plus fréquents
+        :return: <dict> {<str> mot: <int> fréquence}
+        """
+        return dict(self.compteur.most_common(self.k))
+
+
+class Vocabulaire:
+    """
+    Nombre de mots et nombre estimé de mots distincts d'un ensemble de textes.
+    Même usage qu'un Counter pour les statistiques: update, total et len.
+    """
+    def __init__(self, precision=PRECISION):
+        self.mots = 0
+        self.distincts = HyperLogLog(precision)
+
+    def update(self, mots):
+        """
+        Ajoute des mots ou fusionne un autre vocabulaire
+        :param mots: <list|Vocabulaire>
+        """
+        if isinstance(mots, Vocabulaire):
+            self.mots += mots.mots
+            self.distincts.fusion(mots.distincts)
+        else:
+            self.mots += len(mots)
+            self.distincts.update(mots)
+
+    def total(self):
+        """
+        :return: <int> nombre de mots
+        """
+        return self.mots
+
+    def __len__(self):
+        return self.distincts.cardinalite()
+
+    def __repr__(self):
+        return f"<Vocabulaire: {self.mots} mots, ~{len(self)} distincts>"
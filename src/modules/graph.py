@@ -6,6 +6,8 @@ Code pour l'affichage des graph
 import logging
 import os
 
+import numpy as np
+import pandas as pd
 import seaborn as sns
 import matplotlib.pyplot as plt
 import matplotlib.ticker as tck
@@ -13,23 +15,44 @@ import matplotlib.ticker as tck
 logger = logging.getLogger(__name__)
 sns.set()
 
+AGREGATS = ['mean', 'q50', 'q90', 'max']
 
-def q50(x):
+
+def tableau_agregats(data, nom, champs, par_champ=False):
     """
-    Donne la médiane d'une série
-    :param x: <Series>
-    :return: <float>
+    Met en forme les agrégats calculés par la base (cmd_psql.requete_agregats) comme les
+    tableaux pandas agrégés puis dépilés: une colonne par groupe, une ligne par agrégat et champ
+    :param data: <DataFrame> colonnes groupe, champ et une colonne par agrégat
+    :param nom: <str> nom des colonnes de groupe
+    :param champs: <list> champs dans l'ordre des lignes
+    :param par_champ: <bool> lignes par champ puis agrégat, sinon par agrégat puis champ
+    :return: <DataFrame>
     """
-    return x.quantile(0.5)
+    tableau = data.set_index(['groupe', 'champ'])[AGREGATS].stack().unstack('groupe')
+    if par_champ:
+        ordre = pd.MultiIndex.from_product([champs, AGREGATS])
+    else:
+        tableau = tableau.swaplevel()
+        ordre = pd.MultiIndex.from_product([AGREGATS, champs])
+    tableau = tableau.reindex(ordre).astype(float)
+    tableau.index.names = [None, None]
+    tableau.columns.name = nom
+    return tableau
 
 
-def q90(x):
+def matrice_correlations(data, champs):
     """
-    Donne la valeur au percentile 90% d'une série
-    :param x: <Series>
-    :return: <float>
+    Met en forme les corrélations calculées par la base (cmd_psql.requete_correlations) en
+    matrice symétrique, comme DataFrame.corr
+    :param data: <DataFrame> une ligne, colonnes 'nom1|nom2'
+    :param champs: <list>
+    :return: <DataFrame>
     """
-    return x.quantile(0.9)
+    matrice = pd.DataFrame(np.nan, index=champs, columns=champs)
+    for couple, valeur in data.iloc[0].items():
+        nom1, nom2 = couple.split('|')
+        matrice.loc[nom1, nom2] = matrice.loc[nom2, nom1] = valeur
+    return matrice
 
 
 def compacter(value, pos=None):
@@ -85,7 +108,7 @@ def fouille_dash(conf, stats_df, zipf_data, link_df):
 
     row += 1
     index = 0
-    tmp_data = stats_df[(stats_df['etape'] == 'mise_en_base')
+    tmp_data = stats_df[(stats_df['etape'].str.startswith('mise_en_base'))
                         & (stats_df['categorie'] != 'globales')][['categorie', 'mails']]
     axes[row, index].pie(tmp_data['mails'], labels=tmp_data['categorie'],
                          colors=[palette[key] for key in tmp_data['categorie']],
@@ -174,23 +197,24 @@ def fouille_dash(conf, stats_df, zipf_data, link_df):
     plt.show()
 
 
-def feature_correlation(data, conf):
+def feature_correlation(correlations, conf):
     """
-    Génère la matrice de correlation pour les caractéristiques:
-    :param data: <dataframe>
+    Affiche la matrice de correlation pour les caractéristiques:
+    :param correlations: <dataframe> matrice de corrélation
     :param conf: <Settings>
     """
     plt.figure(figsize=(17, 10))
-    sns.heatmap(data.corr(), annot=True)
+    sns.heatmap(correlations, annot=True)
     plt.tight_layout()
     plt.savefig(f'{conf.rapport["images"]}/features_corr.png')
     plt.show()
 
 
-def vecteurs_dash(data_message, data_mot, conf):
+def vecteurs_dash(histogrammes, data_mot, conf):
     """
     Créé le dashboard après la vectorisation
-    :param data_message: <dataframe>
+    :param histogrammes: <dict> {<str> champ: (<dataframe> nombre de documents par categorie et
+    par classe, centre des classes dans la colonne champ, <np.ndarray> bornes des classes)}
     :param data_mot: <dataframe>
     :param conf: <Settings>
     """
@@ -198,27 +222,22 @@ def vecteurs_dash(data_message, data_mot, conf):
     palette = {'ham': '#2ca02c', 'spam': '#d62728'}
     fig, axes = plt.subplots(2, 1, figsize=(10, 5))
     fig.figname = "vectdash"
-    dim_df = data_message[data_message['dimensions'] <= 200]
-    sns.histplot(data=dim_df[['dimensions', 'categorie']],
-                 x='dimensions',
-                 hue='categorie',
-                 multiple="dodge",
-                 shrink=0.8,
-                 ax=axes[0],
-                 palette=palette,
-                 bins=70)
+    for axe, champ in zip(axes, ['dimensions', 'somme']):
+        if champ not in histogrammes:
+            continue
+        data, bornes = histogrammes[champ]
+        sns.histplot(data=data,
+                     x=champ,
+                     weights='nombre',
+                     hue='categorie',
+                     multiple="dodge",
+                     shrink=0.8,
+                     ax=axe,
+                     palette=palette,
+                     bins=bornes)
     axes[0].set_title("Répartitions des documents par nombre de dimensions")
     axes[0].set_ylabel("Nombre de documents")
 
-    sum_df = data_message[data_message['somme'] <= 1000]
-    sns.histplot(data=sum_df[['somme', 'categorie']],
-                 x='somme',
-                 hue='categorie',
-                 multiple="dodge",
-                 shrink=0.8,
-                 ax=axes[1],
-                 palette=palette,
-                 bins=70)
     axes[1].set_title("Répartitions des documents par somme vectorielle")
     axes[1].set_ylabel("Nombre de documents")
 
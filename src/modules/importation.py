@@ -5,10 +5,18 @@ Module pour la gestion des importations dans le programme
 
 import re
 import os
+import datetime
 import logging
+import mmap
+import queue
+import tarfile
+import threading
+import time
+import zipfile
 import email
 import email.header
 import email.message
+import email.parser
 
 from src.modules import nettoyage
 
@@ -17,42 +25,242 @@ logger = logging.getLogger(__name__)
 
 def get_files(folder):
     """
-    Liste tous les fichiers d'un répertoire
+    Parcourt tous les fichiers d'un répertoire au fur et à mesure de leur découverte.
     :param folder: <str>
-    :return: <list>
+    :return: <generator> de <str>
     """
-    subdir = [d[0] for d in os.walk(folder)]
-    files = []
+    for chemin, _ in scan_files(folder):
+        yield chemin
 
-    for sd in subdir:
-        for f in os.listdir(sd):
-            x = os.path.join(sd, f)
-            if os.path.isfile(x):
-                files.append(x)
 
-    return files
+def scan_files(folder, taille_max=None, extensions=None):
+    """
+    Parcourt récursivement un répertoire avec os.scandir: chaque dossier n'est lu qu'une fois et
+    chaque fichier ne coûte qu'un stat, réutilisé par l'appelant.
+    Pour un dossier maildir seuls cur/ et new/ sont parcourus, tmp/ contient des messages en
+    cours d'écriture.
+    :param folder: <str>
+    :param taille_max: <int> taille maximale des fichiers en octets
+    :param extensions: <tuple> extensions acceptées, en minuscules
+    :return: <generator> de <tuple> (<str> chemin, <os.stat_result>)
+    """
+    a_parcourir = [folder]
+    while a_parcourir:
+        dossier = a_parcourir.pop()
+        sous_dossiers = []
+        try:
+            with os.scandir(dossier) as entrees:
+                for entree in entrees:
+                    if entree.is_dir(follow_symlinks=False):
+                        sous_dossiers.append(entree.name)
+                        continue
+                    if not entree.is_file():
+                        continue
+                    if extensions and not entree.name.lower().endswith(extensions):
+                        continue
+                    stat = entree.stat()
+                    if taille_max is not None and stat.st_size > taille_max:
+                        continue
+                    yield entree.path, stat
+        except OSError as err:
+            logger.warning("Dossier illisible %s - %s", dossier, err)
+            continue
+
+        if 'tmp' in sous_dossiers and 'cur' in sous_dossiers and 'new' in sous_dossiers:
+            sous_dossiers.remove('tmp')
+        a_parcourir.extend(os.path.join(dossier, nom) for nom in reversed(sous_dossiers))
+
+
+ARCHIVES = ('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.zip')
+
+
+def is_archive(path):
+    """
+    Indique si le chemin désigne une archive supportée
+    :param path: <str>
+    :return: <bool>
+    """
+    return os.path.isfile(path) and path.lower().endswith(ARCHIVES)
+
+
+def get_archive_members(path, ignorer=None):
+    """
+    Parcourt les fichiers d'une archive tar (compressée ou non) ou zip sans les extraire sur
+    le disque. Les tar sont lues en flux, les membres ignorés ne sont pas conservés en mémoire.
+    :param path: <str> chemin de l'archive
+    :param ignorer: <function> (nom, taille, mtime) -> <bool> membre à ne pas lire
+    :return: <generator> de <tuple> (<str> nom, <int> taille, <int> mtime, <bytes> contenu)
+    """
+    if path.lower().endswith('.zip'):
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                if info.is_dir():
+                    continue
+                mtime = int(datetime.datetime(*info.date_time).timestamp()) * 10**9
+                if ignorer and ignorer(info.filename, info.file_size, mtime):
+                    continue
+                yield info.filename, info.file_size, mtime, archive.read(info)
+        return
+
+    with tarfile.open(path, 'r|*') as archive:
+        for member in archive:
+            if not member.isfile():
+                continue
+            mtime = int(member.mtime) * 10**9
+            if ignorer and ignorer(member.name, member.size, mtime):
+                continue
+            yield member.name, member.size, mtime, archive.extractfile(member).read()
+
+
+def is_mbox(path):
+    """
+    Indique si le chemin désigne un fichier au format mbox
+    :param path: <str>
+    :return: <bool>
+    """
+    if not os.path.isfile(path) or path.lower().endswith(ARCHIVES):
+        return False
+    with open(path, 'rb') as f_bin:
+        return f_bin.read(5) == b'From '
+
+
+def index_mbox(path):
+    """
+    Indexe les messages d'un fichier mbox par leurs positions dans le fichier.
+    Le fichier est projeté en mémoire et seuls les séparateurs 'From ' en début de ligne sont
+    recherchés, aucun message n'est copié.
+    Comme pour le module mailbox, la ligne 'From ' et la ligne vide qui termine chaque message
+    sont exclues: le message est identique à celui enregistré seul dans un fichier.
+    :param path: <str>
+    :return: <generator> de <tuple> (<int> début, <int> fin)
+    """
+    with open(path, 'rb') as f_bin:
+        if os.fstat(f_bin.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f_bin.fileno(), 0, access=mmap.ACCESS_READ) as projection:
+            position = 0
+            while position < len(projection):
+                suivant = projection.find(b'\nFrom ', position)
+                limite = len(projection) if suivant < 0 else suivant + 1
+                debut = position
+                if projection[debut:debut + 5] == b'From ':
+                    debut = projection.find(b'\n', debut, limite) + 1 or limite
+                yield debut, fin_mbox(projection, debut, limite)
+                position = limite
+
+
+def fin_mbox(projection, debut, limite):
+    """
+    Fin d'un message mbox sans la ligne vide ajoutée après chaque message
+    :param projection: <mmap.mmap>
+    :param debut: <int> début du message
+    :param limite: <int> début de la ligne 'From ' suivante ou fin du fichier
+    :return: <int>
+    """
+    for vide in (b'\n\n', b'\r\n\r\n'):
+        if limite - len(vide) >= debut and projection[limite - len(vide):limite] == vide:
+            return limite - len(vide) // 2
+    return limite
+
 
+MBOX_OUVERTS = {}
 
-def get_text_file(file):
+
+def get_mbox_message(path, debut, fin):
+    """
+    Récupère le contenu brut d'un message mbox à partir de ses positions, sans copie.
+    La projection mémoire du fichier est conservée pour les appels suivants du processus,
+    penser à libérer la vue avant fermer_mbox.
+    :param path: <str>
+    :param debut: <int>
+    :param fin: <int>
+    :return: <memoryview>
+    """
+    if path not in MBOX_OUVERTS:
+        with open(path, 'rb') as f_bin:
+            MBOX_OUVERTS[path] = mmap.mmap(f_bin.fileno(), 0, access=mmap.ACCESS_READ)
+    return memoryview(MBOX_OUVERTS[path])[debut:fin]
+
+
+def fermer_mbox():
+    """
+    Ferme les projections mémoire des mbox ouvertes par le processus
+    """
+    for projection in MBOX_OUVERTS.values():
+        projection.close()
+    MBOX_OUVERTS.clear()
+
+
+def flux_paralleles(iterables, taille=100):
     """
-    Récupère le texte d'un fichier
+    Consomme plusieurs itérables en parallèle, un thread par itérable, et fusionne leurs
+    éléments dans une file bornée. Utile pour les lectures dominées par les I/O ou la
+    décompression qui libèrent le GIL.
+    :param iterables: <list> d'itérables
+    :param taille: <int> taille maximale de la file
+    :return: <generator>
+    """
+    if len(iterables) == 1:
+        yield from iterables[0]
+        return
+
+    file_elements = queue.Queue(maxsize=taille)
+    fin = object()
+
+    def producteur(iterable):
+        try:
+            for element in iterable:
+                file_elements.put(element)
+        except (OSError, tarfile.TarError, zipfile.BadZipFile) as err:
+            logger.error("Echec de lecture d'une source - %s", err)
+        finally:
+            file_elements.put(fin)
+
+    threads = [threading.Thread(target=producteur, args=(iterable,), daemon=True)
+               for iterable in iterables]
+    for thread in threads:
+        thread.start()
+
+    actifs = len(threads)
+    while actifs:
+        element = file_elements.get()
+        if element is fin:
+            actifs -= 1
+            continue
+        yield element
+
+
+def get_raw_file(file):
+    """
+    Récupère le contenu brut d'un fichier
     :param file: <str>
-    :return: <str>
+    :return: <bytes>
     """
-    try:
-        with open(file, 'r', encoding='utf-8') as f_obj:
-            return f_obj.read()
-    except UnicodeError as err:
-        logger.debug("Fichier %s - %s", file, err)
-        return ""
+    with open(file, 'rb') as f_bin:
+        return f_bin.read()
+
+
+def map_file(file):
+    """
+    Projette un fichier en mémoire en lecture seule, penser à fermer la projection
+    :param file: <str>
+    :return: <mmap.mmap|bytes> contenu vide pour un fichier vide
+    """
+    with open(file, 'rb') as f_bin:
+        if os.fstat(f_bin.fileno()).st_size == 0:
+            return b''
+        return mmap.mmap(f_bin.fileno(), 0, access=mmap.ACCESS_READ)
 
 
 def load_mail(file):
     """
     Lis un fichier dans le format mail
-    :param file: <str>
+    :param file: <str|bytes> chemin du fichier ou contenu brut
     :return: <EmailMessage>
     """
+    if isinstance(file, bytes):
+        return email.message_from_bytes(file)
+
     with open(file, 'rb') as f_bin:
         return email.message_from_binary_file(f_bin)
 
@@ -62,35 +270,244 @@ def extract_mail_body(msg):
     :param msg: <EmailMessage> Mail
     :return: <str>
     """
-    refused_charset = ['unknown-8bit', 'default', 'default_charset',
-                       'gb2312_charset', 'chinesebig5', 'big5']
-    body = ""
-
     if msg.is_multipart():
-        for part in msg.walk():
-            if not part.is_multipart():
-                body += extract_mail_body(part)
-        return body
+        return ''.join(extract_mail_body(part) for part in msg.walk() if not part.is_multipart())
 
-    if msg.get_content_maintype() != 'text':
+    if msg.get_content_maintype() != 'text' or msg.get_content_charset() in REFUSED_CHARSET:
         return ""
 
-    if msg.get_content_charset() in refused_charset:
-        return ""
+    match msg.get_content_subtype():
+        case 'plain':
+            return msg.get_payload(decode=True).decode(errors='ignore')
+        case 'html':
+            return nettoyage.clear_html(msg.get_payload(decode=True).decode(errors='ignore'))
+        case 'enriched':
+            return nettoyage.clear_enriched(msg.get_payload(decode=True).decode(errors='ignore'))
 
-    if msg.get_content_subtype() == 'plain':
-        payload = msg.get_payload(decode=True)
-        body += payload.decode(errors='ignore')
+    return ""
 
-    if msg.get_content_subtype() == 'html':
-        payload = msg.get_payload(decode=True)
-        body += nettoyage.clear_html(payload.decode(errors='ignore'))
 
-    if msg.get_content_subtype() == 'enriched':
-        payload = msg.get_payload(decode=True)
-        body += nettoyage.clear_enriched(payload.decode(errors='ignore'))
+REFUSED_CHARSET = ['unknown-8bit', 'default', 'default_charset',
+                   'gb2312_charset', 'chinesebig5', 'big5']
+
+
+def load_mail_texte(raw, max_octets=None):
+    """
+    Lit un mail brut en ne décodant que ses parties textes.
+    Les limites MIME sont repérées directement dans le contenu brut (bytes ou projection mémoire),
+    seules les entêtes des autres parties sont lues: une pièce jointe ne coûte pas son décodage.
+    Le corps obtenu est identique à celui d'extract_mail_body, une structure non reconnue est
+    confiée au parseur complet. Un retour chariot seul étant une fin de ligne pour le parseur
+    email, il n'est recherché que là où il change le découpage: entêtes, parties textes et
+    lignes de limite, jamais dans le contenu des pièces jointes.
+    :param raw: <bytes|mmap.mmap|memoryview>
+    :param max_octets: <int> taille maximale du corps conservé, en octets utf-8
+    :return: <tuple> (<Message> entêtes du mail, <str> corps)
+    """
+    lecteur = LecteurTextes(raw, max_octets)
+    textes = lecteur.textes
+    entete, corps = decoupe_entete(raw, 0, len(raw))
+    if entete is not None and not lecteur.partie(entete, corps, len(raw)):
+        entete = None
+
+    if entete is None:
+        logger.debug("Structure MIME non reconnue - lecture complète du mail")
+        entete = email.message_from_bytes(bytes(raw))
+        textes = [extract_mail_body(entete)]
+
+    body = ''.join(textes)
+    if max_octets is not None:
+        octets = body.encode('utf-8', 'surrogatepass')
+        if len(octets) > max_octets:
+            body = octets[:max_octets].decode('utf-8', 'ignore')
+    return entete, body
+
+
+def cr_seul(raw, debut, fin):
+    """
+    Cherche un retour chariot seul dans une zone d'un contenu brut
+    :param raw: <bytes|mmap.mmap|memoryview>
+    :param debut: <int>
+    :param fin: <int>
+    :return: <bool>
+    """
+    return CR_SEUL.search(raw, debut, min(fin + 1, len(raw))) is not None
+
+
+CR_SEUL = re.compile(rb'\r(?!\n)')
+LIGNE_VIDE = re.compile(rb'\n\r?\n')
+
+
+def decoupe_entete(raw, debut, fin):
+    """
+    Lit les entêtes d'une partie MIME sans lire son contenu
+    :param raw: <bytes|mmap.mmap|memoryview>
+    :param debut: <int>
+    :param fin: <int>
+    :return: <tuple> (<Message|None> entêtes, None si elles sont mal formées ou contiennent un
+    retour chariot seul, <int> début du contenu)
+    """
+    if raw[debut:debut + 1] == b'\n' or raw[debut:debut + 2] == b'\r\n':
+        return email.message.Message(), debut + (1 if raw[debut:debut + 1] == b'\n' else 2)
+
+    separation = LIGNE_VIDE.search(raw, debut, fin)
+    limite = separation.start() + 1 if separation else fin
+    if cr_seul(raw, debut, separation.end() if separation else fin):
+        return None, fin
+    entete = email.parser.BytesParser().parsebytes(bytes(raw[debut:limite]), headersonly=True)
+    if entete.defects or entete.get_payload():
+        return None, fin
+    return entete, separation.end() if separation else fin
+
+
+class LecteurTextes:
+    """
+    Décode les parties textes d'un mail brut en suivant le découpage du parseur email:
+    limites consécutives fusionnées, saut de ligne précédant une limite retiré du contenu des
+    parties simples, parties message/* lues comme des mails.
+    Chaque méthode de lecture renvoie False si la structure n'est pas reconnue.
+    """
+    def __init__(self, raw, max_octets=None):
+        self.raw = raw
+        self.max_octets = max_octets
+        self.textes = []
+
+    def partie(self, entete, debut, fin, dans_multipart=False):
+        """
+        Lit une partie MIME selon son type
+        :param entete: <Message> entêtes de la partie
+        :param debut: <int> début du contenu
+        :param fin: <int> fin du contenu
+        :param dans_multipart: <bool> la partie est un élément d'un multipart ou son contenu
+        message/*
+        :return: <bool>
+        """
+        # Un caractère fait au moins un octet: le corps dépasse déjà la limite en octets
+        if self.max_octets is not None and \
+                sum(len(texte) for texte in self.textes) >= self.max_octets:
+            return True
+
+        match entete.get_content_maintype():
+            case 'multipart':
+                return self.multipart(entete, debut, fin)
+            case 'message':
+                return self.message(entete, debut, fin, dans_multipart)
+            case 'text':
+                return self.texte(entete, debut, fin, dans_multipart)
+        return True
+
+    def multipart(self, entete, debut, fin):
+        """
+        Découpe le contenu d'un multipart selon ses limites
+        :param entete: <Message>
+        :param debut: <int>
+        :param fin: <int>
+        :return: <bool>
+        """
+        limite = entete.get_boundary()
+        if not limite or entete.get_content_subtype() == 'digest':
+            return False
+        try:
+            limite = limite.encode('ascii', 'surrogateescape')
+        except UnicodeError:
+            return False
+
+        raw = self.raw
+        marque = b'--' + limite
+        limites = re.compile(rb'^--' + re.escape(limite) + rb'(--)?[ \t]*(?:\r?\n|\Z)',
+                             flags=re.MULTILINE)
+        # Limite précédée ou terminée par un retour chariot seul, ligne de limite pour le parseur
+        if trouve(raw, b'\r' + marque, debut, fin) >= 0 or \
+                re.compile(re.escape(marque) + rb'(--)?[ \t]*\r(?!\n)').search(raw, debut, fin):
+            return False
+        ligne = cherche_limite(raw, marque, limites, debut, fin)
+        if ligne is None or ligne.group(1):
+            return False
+
+        while ligne is not None and not ligne.group(1):
+            suivante = limites.match(raw, ligne.end(), fin)
+            while suivante is not None:
+                ligne = suivante
+                suivante = limites.match(raw, ligne.end(), fin) if ligne.end() < fin else None
+
+            partie = ligne.end()
+            ligne = cherche_limite(raw, marque, limites, partie, fin)
+            fin_partie = ligne.start() if ligne else fin
+            sous_entete, corps = decoupe_entete(raw, partie, fin_partie)
+            if sous_entete is None or not self.partie(sous_entete, corps, fin_partie, True):
+                return False
+
+        return True
+
+    def message(self, entete, debut, fin, dans_multipart):
+        """
+        Lit une partie message/* comme un mail
+        :param entete: <Message>
+        :param debut: <int>
+        :param fin: <int>
+        :param dans_multipart: <bool>
+        :return: <bool>
+        """
+        if entete.get_content_subtype() == 'delivery-status':
+            return False
+        sous_entete, corps = decoupe_entete(self.raw, debut, fin)
+        if sous_entete is None:
+            return False
+        return self.partie(sous_entete, corps, fin, dans_multipart)
+
+    def texte(self, entete, debut, fin, dans_multipart):
+        """
+        Décode une partie texte
+        :param entete: <Message>
+        :param debut: <int>
+        :param fin: <int>
+        :param dans_multipart: <bool>
+        :return: <bool>
+        """
+        raw = self.raw
+        if cr_seul(raw, debut, fin):
+            return False
+        if dans_multipart and fin > debut and raw[fin - 1:fin] == b'\n':
+            fin -= 2 if fin - 1 > debut and raw[fin - 2:fin - 1] == b'\r' else 1
+        entete.set_payload(bytes(raw[debut:fin]).decode('ascii', 'surrogateescape'))
+        self.textes.append(extract_mail_body(entete))
+        return True
+
+
+def cherche_limite(raw, marque, limites, debut, fin):
+    """
+    Cherche la prochaine ligne de limite d'un multipart.
+    La marque est cherchée par find, bien plus rapide qu'une recherche par expression régulière
+    sur le contenu d'une pièce jointe, l'expression ne valide que les occurrences trouvées.
+    :param raw: <bytes|mmap.mmap|memoryview>
+    :param marque: <bytes> '--' suivi de la limite
+    :param limites: <re.Pattern> lignes de limite
+    :param debut: <int>
+    :param fin: <int>
+    :return: <re.Match|None>
+    """
+    position = trouve(raw, marque, debut, fin)
+    while position >= 0:
+        if ligne := limites.match(raw, position, fin):
+            return ligne
+        position = trouve(raw, marque, position + 1, fin)
+    return None
 
-    return body
+
+def trouve(raw, motif, debut, fin):
+    """
+    Position d'un motif dans un contenu brut, comme bytes.find. Une vue mémoire n'ayant pas de
+    find, le motif y est cherché par une expression régulière littérale
+    :param raw: <bytes|mmap.mmap|memoryview>
+    :param motif: <bytes>
+    :param debut: <int>
+    :param fin: <int>
+    :return: <int> -1 si absent
+    """
+    if isinstance(raw, memoryview):
+        trouvee = re.compile(re.escape(motif)).search(raw, debut, fin)
+        return trouvee.start() if trouvee else -1
+    return raw.find(motif, debut, fin)
 
 
 def extract_mail_meta(msg):
@@ -130,18 +547,81 @@ FW_MARKERS = [
 
 def keep_forwarded(body):
     """
-    Conserve uniquement la partie forward du message
+    Conserve uniquement la partie forward du message, jusqu'au marqueur suivant s'il y en a un
     :param body: <str>
     """
     for marker in FW_MARKERS:
-        if marker in body:
-            return body.split(marker)[1]
+        debut = body.find(marker)
+        if debut >= 0:
+            debut += len(marker)
+            fin = body.find(marker, debut)
+            return body[debut:fin] if fin >= 0 else body[debut:]
     return body
 
 
-# FW_PATTERN = re.compile(r"\s*(De|From)\s:\s+.+\s*<(?P<sender>.+)>\s*")
-FW_PATTERN = re.compile(r"\s*(De|From)\s:\s.+<(?P<sender>.+)>\s*Date\s*:(?P<date>.+)+\s*"
-                        r"Subject\s*:\s*(?P<subject>.+)\s*To:\s*.+\s*(?P<body>((.)*\s*)*)")
+FW_ENTETES = {'from': 'From', 'de': 'From',
+              'date': 'Date', 'sent': 'Date', 'envoyé': 'Date',
+              'subject': 'Subject', 'objet': 'Subject',
+              'to': 'To', 'à': 'To', 'a': 'To',
+              'cc': 'Cc'}
+FW_REQUIS = ('From', 'Subject')
+FW_ADRESSE = re.compile(r"<([^<>\n]+)>")
+FW_LIGNES = 100
+FW_FENETRE = 65536
+FW_BUDGET = 0.05
+
+
+def parse_forwarded(body, lignes_max=FW_LIGNES, budget=FW_BUDGET):
+    """
+    Lit l'entête d'un message transféré ligne à ligne.
+    L'entête commence à la première ligne 'From :' ou 'De :' et s'étend sur les lignes
+    'Nom : valeur' suivantes, lignes vides comprises, le corps commence à la première autre ligne.
+    Chaque ligne est lue une seule fois sans retour arrière et seuls les FW_FENETRE premiers
+    caractères sont parcourus: le temps est borné quelle que soit la taille du message, et par un
+    budget de temps CPU.
+    :param body: <str>
+    :param lignes_max: <int> nombre maximal de lignes parcourues
+    :param budget: <float> temps CPU maximal en secondes
+    :return: <dict|None> entêtes et corps, None si aucune entête complète n'est trouvée
+    """
+    limite = time.process_time() + budget
+    fenetre = min(len(body), FW_FENETRE)
+    entetes = None
+    position = 0
+    for _ in range(lignes_max):
+        if time.process_time() > limite:
+            logger.warning("Budget de lecture du message transféré dépassé")
+            return None
+
+        fin = body.find('\n', position, fenetre)
+        if fin < 0 and fenetre < len(body):
+            break
+        fin = len(body) if fin < 0 else fin
+        ligne = body[position:fin]
+        nom, separateur, valeur = ligne.partition(':')
+        nom = FW_ENTETES.get(nom.strip().lower()) if separateur else None
+
+        if entetes is None and nom == 'From':
+            entetes = {}
+        if entetes is not None:
+            if nom:
+                entetes.setdefault(nom, valeur.strip())
+            elif ligne.strip():
+                break
+
+        if fin == len(body):
+            position = fin
+            break
+        position = fin + 1
+
+    if entetes is None or not all(entetes.get(nom) for nom in FW_REQUIS):
+        return None
+
+    if adresse := FW_ADRESSE.search(entetes['From']):
+        entetes['From'] = adresse[1].strip()
+    entetes['body'] = body[position:].lstrip()
+    return entetes
+
 
 def format_forwarded(body):
     """
@@ -149,13 +629,13 @@ def format_forwarded(body):
     :param body: <str>
     :return: <email>
     """
-    if result := re.search(FW_PATTERN, body):
-        result = result.groupdict()
+    if result := parse_forwarded(body):
         new_email = email.message.EmailMessage()
-        new_email['From'] = result.get('sender')
-        new_email['Date'] = result.get('date')
-        new_email['Subject'] = result.get('subject')
-        new_email.set_content(result.get('body', ''))
+        new_email['From'] = result['From']
+        if 'Date' in result:
+            new_email['Date'] = result['Date']
+        new_email['Subject'] = result['Subject']
+        new_email.set_content(result['body'])
         return new_email
 
     return email.message_from_string(body)
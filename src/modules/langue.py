@@ -0,0 +1,188 @@
+# coding: utf-8
+"""
+Module de détection de la langue des messages.
+
+Reprend les profils de n-grammes de caractères de langdetect mais remplace son échantillonnage
+aléatoire par le calcul exact du classifieur bayésien naïf qu'il approxime: le résultat est
+déterministe et les scores d'un lot de textes sont calculés en une seule opération numpy.
+"""
+
+import re
+import logging
+from collections import Counter
+
+import numpy as np
+from langdetect import detector_factory
+from langdetect import lang_detect_exception
+from langdetect.detector import Detector
+from langdetect.utils.ngram import NGram
+
+logger = logging.getLogger(__name__)
+
+PREFIXE = 10000
+LISSAGE = Detector.ALPHA_DEFAULT / Detector.BASE_FREQ
+SEUIL = Detector.PROB_THRESHOLD
+INCONNUE = Detector.UNKNOWN_LANG
+
+ESPACES = re.compile(r' {2,}')
+LATIN = re.compile(r'[A-z]')
+NON_LATIN = re.compile('[\u0300-\u1dff\u1f00-\U0010ffff]')
+HORS_LATIN = re.compile(r'[A-z]+')
+
+
+class Normalisation(dict):
+    """
+    Table de traduction des caractères selon la normalisation des n-grammes de langdetect.
+    Chaque caractère n'est normalisé qu'une fois par processus.
+    """
+    def __missing__(self, code):
+        self[code] = NGram.normalize(chr(code))
+        return self[code]
+
+
+NORMALISATION = Normalisation()
+
+MODELE = {}
+
+
+def get_modele():
+    """
+    Charge les profils de langdetect sous forme matricielle: un index par n-gramme et une matrice
+    des log-probabilités lissées (n-grammes x langues).
+    Le modèle est conservé pour le processus, le charger avant la création d'un pool permet de le
+    partager entre les processus issus d'un fork.
+    :return: <dict> {'langues': <list>, 'index': <dict>, 'log_proba': <np.ndarray>}
+    """
+    if not MODELE:
+        detector_factory.init_factory()
+        factory = detector_factory._factory  # pylint: disable=protected-access
+        index = {}
+        log_proba = np.empty((len(factory.word_lang_prob_map), len(factory.langlist)))
+        for i, (ngram, probas) in enumerate(factory.word_lang_prob_map.items()):
+            index[ngram] = i
+            log_proba[i] = probas
+        np.log(log_proba + LISSAGE, out=log_proba)
+        MODELE.update({'langues': list(factory.langlist), 'index': index, 'log_proba': log_proba})
+        logger.debug("Profils de langues chargés - %s n-grammes, %s langues",
+                     len(index), len(factory.langlist))
+    return MODELE
+
+
+def preparation(texte, prefixe=PREFIXE):
+    """
+    Prépare un texte comme langdetect: suppression des urls et adresses mail, normalisation du
+    vietnamien, troncature, fusion des espaces et suppression des caractères latins dans un texte
+    majoritairement non latin
+    :param texte: <str>
+    :param prefixe: <int> nombre de caractères analysés
+    :return: <str>
+    """
+    texte = Detector.URL_RE.sub(' ', texte)
+    texte = Detector.MAIL_RE.sub(' ', texte)
+    texte = NGram.normalize_vi(texte)
+    texte = ESPACES.sub(' ', texte[:prefixe])
+
+    if len(LATIN.findall(texte)) * 2 < len(NON_LATIN.findall(texte)):
+        texte = HORS_LATIN.sub('', texte)
+    return texte
+
+
+def extraction(texte, prefixe=PREFIXE):
+    """
+    Extrait et compte les n-grammes (1 à 3 caractères) d'un texte connus des profils.
+    Les mots entièrement en majuscules sont ignorés comme dans langdetect.
+    :param texte: <str>
+    :param prefixe: <int> nombre de caractères analysés
+    :return: <Counter> {<int> index du n-gramme: <int> occurrences}
+    """
+    index = get_modele()['index']
+    compteur = Counter()
+    grams = ' '
+    majuscules = False
+    for car in preparation(texte, prefixe).translate(NORMALISATION):
+        precedent = grams[-1]
+        if precedent == ' ':
+            grams = ' '
+            majuscules = False
+            if car == ' ':
+                continue
+        elif len(grams) >= 3:
+            grams = grams[1:]
+        grams += car
+
+        majuscules = car.isupper() and precedent.isupper()
+        if majuscules:
+            continue
+        if car != ' ':
+            compteur[car] += 1
+        if len(grams) > 1:
+            compteur[grams[-2:]] += 1
+            if len(grams) > 2:
+                compteur[grams] += 1
+
+    return Counter({index[ngram]: nb for ngram, nb in compteur.items() if ngram in index})
+
+
+def detecter_lot(textes, prefixe=PREFIXE):
+    """
+    Détecte la langue d'un lot de textes.
+    Les scores de tous les textes sont calculés par une seule somme pondérée des
+    log-probabilités des n-grammes.
+    :param textes: <list> de <str>
+    :param prefixe: <int> nombre de caractères analysés par texte
+    :return: <list> de <str|None> code de la langue, None si aucun n-gramme n'est exploitable
+    """
+    modele = get_modele()
+    comptes = [extraction(texte, prefixe) for texte in textes]
+    tailles = np.fromiter((len(compte) for compte in comptes), dtype=np.int64, count=len(comptes))
+    resultats = [None] * len(comptes)
+    if not tailles.sum():
+        return resultats
+
+    indices = np.fromiter((i for compte in comptes for i in compte.keys()), dtype=np.int64)
+    poids = np.fromiter((n for compte in comptes for n in compte.values()), dtype=np.float64)
+    scores = modele['log_proba'][indices] * poids[:, None]
+
+    presents = np.flatnonzero(tailles)
+    debuts = np.concatenate(([0], np.cumsum(tailles)[:-1]))[presents]
+    scores = np.add.reduceat(scores, debuts, axis=0)
+
+    scores -= scores.max(axis=1, keepdims=True)
+    probas = np.exp(scores)
+    probas /= probas.sum(axis=1, keepdims=True)
+    meilleures = probas.argmax(axis=1)
+
+    for ligne, position in enumerate(presents):
+        if probas[ligne, meilleures[ligne]] > SEUIL:
+            resultats[position] = modele['langues'][meilleures[ligne]]
+        else:
+            resultats[position] = INCONNUE
+    return resultats
+
+
+def detecter(texte, prefixe=PREFIXE):
+    """
+    Détecte la langue d'un texte
+    :param texte: <str>
+    :param prefixe: <int> nombre de caractères analysés
+    :return: <str|None> code de la langue, None si aucun n-gramme n'est exploitable
+    """
+    return detecter_lot([texte], prefixe)[0]
+
+
+def detecter_langdetect(texte, prefixe=PREFIXE):
+    """
+    Détection de référence par langdetect, graine fixée pour un résultat reproductible
+    :param texte: <str>
+    :param prefixe: <int> nombre de caractères analysés
+    :return: <str|None>
+    """
+    detector_factory.DetectorFactory.seed = 0
+    detector_factory.init_factory()
+    detecteur = detector_factory._factory.create()  # pylint: disable=protected-access
+    detecteur.set_max_text_length(prefixe)
+    detecteur.append(texte)
+    try:
+        return detecteur.detect()
+    except lang_detect_exception.LangDetectException:
+        return None
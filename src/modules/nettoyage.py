@@ -6,6 +6,7 @@ import re
 import warnings
 import logging
 from bs4 import BeautifulSoup
+from lxml import etree
 
 logger = logging.getLogger(__name__)
 
@@ -13,6 +14,23 @@ logger = logging.getLogger(__name__)
 def clear_html(texte):
     """ Supprime les balises des textes.
             - html
+    Le texte est extrait au fil des évènements du parseur lxml sans construire d'arbre.
+    BeautifulSoup n'est utilisé qu'en secours si lxml rejette le contenu.
+    :param texte: <str>
+    :return: <str>
+    """
+    try:
+        parseur = etree.HTMLParser(target=ExtracteurTexte(), recover=True)
+        parseur.feed(texte[1:] if texte[:1] == '\ufeff' else texte)
+        return parseur.close()
+    except (etree.ParserError, UnicodeError, LookupError) as err:
+        logger.debug("Extraction du texte html par BeautifulSoup - %s", err)
+
+    return clear_html_soup(texte)
+
+
+def clear_html_soup(texte):
+    """ Supprime les balises des textes par BeautifulSoup.
     :param texte: <str>
     :return: <str>
     """
@@ -23,6 +41,75 @@ def clear_html(texte):
     return brut
 
 
+class ExtracteurTexte:
+    """
+    Cible du parseur html de lxml reproduisant le texte de BeautifulSoup(texte, "lxml").text:
+        - les textes sont découpés à chaque balise, commentaire ou déclaration
+        - un texte fait uniquement d'espaces ASCII devient un espace ou un saut de ligne, sauf
+          dans pre et textarea
+        - les textes de script, style, template, rt et rp ainsi que les commentaires,
+          déclarations et instructions sont ignorés
+    """
+    IGNORES = {'script', 'style', 'template', 'rt', 'rp'}
+    ESPACES = {'pre', 'textarea'}
+    ESPACES_ASCII = ' \n\t\x0c\r'
+
+    def __init__(self):
+        self.textes = []
+        self.courant = []
+        self.ignores = 0
+        self.espaces = 0
+
+    def fin_texte(self):
+        """
+        Termine le texte en cours
+        """
+        if not self.courant:
+            return
+        texte = ''.join(self.courant)
+        self.courant = []
+        if self.ignores:
+            return
+        if not self.espaces and not texte.strip(self.ESPACES_ASCII):
+            texte = '\n' if '\n' in texte else ' '
+        self.textes.append(texte)
+
+    def start(self, balise, _attributs, _nsmap=None):
+        """ Ouverture d'une balise """
+        self.fin_texte()
+        self.ignores += balise in self.IGNORES
+        self.espaces += balise in self.ESPACES
+
+    def end(self, balise):
+        """ Fermeture d'une balise """
+        self.fin_texte()
+        self.ignores -= balise in self.IGNORES
+        self.espaces -= balise in self.ESPACES
+
+    def data(self, texte):
+        """ Texte """
+        self.courant.append(texte)
+
+    def comment(self, _texte):
+        """ Commentaire """
+        self.fin_texte()
+
+    def doctype(self, *_args):
+        """ Déclaration du type de document """
+        self.fin_texte()
+
+    def pi(self, *_args):
+        """ Instruction """
+        self.fin_texte()
+
+    def close(self):
+        """ Fin du document
+        :return: <str>
+        """
+        self.fin_texte()
+        return ''.join(self.textes)
+
+
 pattern_enriched = re.compile('<.*>')
 
 
@@ -35,26 +122,34 @@ def clear_enriched(texte):
 
 
 def clear_texte_init(texte):
-    """ Fonction principale de traitement du texte
+    """ Fonction principale de traitement du texte.
+    Applique les passes de NETTOYAGE dans l'ordre de clear_reply, change_lien, change_nombres et
+    clear_ponctuation. Une passe dont aucune ancre n'est présente dans le texte ne peut rien
+    trouver et n'est pas exécutée.
     :param texte: <str>
     :return: <str>
     """
     liens = {'URL': 0, 'MAIL': 0, 'TEL': 0, 'NOMBRE': 0, 'PRIX': 0}
-    temp = clear_reply(texte)
-    temp = change_lien(temp, liens)
-    temp = change_nombres(temp, liens)
-    temp = clear_ponctuation(temp)
+    temp = texte
+    for categorie, pattern, ancres in NETTOYAGE:
+        if ancres and not any(ancre in temp for ancre in ancres):
+            continue
+        temp, nb = pattern.subn('', temp)
+        if categorie:
+            liens[categorie] += nb
 
     return temp, liens
 
 
+pattern_reply = re.compile('^>.*$', flags=re.MULTILINE)
+
+
 def clear_reply(texte):
     """ Supprime les parties correspondantes au mail precedent
     :param texte: <str>
     :return: <str>
     """
-    pattern = re.compile('^>.*$', flags=re.MULTILINE)
-    return re.sub(pattern, '', texte)
+    return re.sub(pattern_reply, '', texte)
 
 
 pattern_mail = re.compile('[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\\.[a-zA-Z0-9-.]+')
@@ -116,3 +211,30 @@ def clear_ponctuation(texte):
     :return: <str>
     """
     return re.sub(pattern_ponct, '', texte)
+
+
+# Variantes des motifs de change_lien trouvant exactement les mêmes correspondances sans retour
+# arrière inutile. Le texte nettoyé sert à calculer l'identifiant des documents, tout écart
+# créerait des doublons en base.
+#   - mail: la partie locale ne peut s'arrêter qu'au '@', elle est rendue possessive
+#   - url1: une correspondance commence forcément par un schéma suivi de '://' ou par '://'
+#   - url2: une correspondance ne peut pas commencer au milieu d'un mot, si elle échoue au début
+#     du mot elle échoue à toutes les positions suivantes du mot
+pattern_mail_rapide = re.compile('[a-zA-Z0-9_.+-]++@[a-zA-Z0-9-]+\\.[a-zA-Z0-9-.]+')
+pattern_url1_rapide = re.compile(r'(?=https?://|ftp://|://)' + pattern_url1.pattern,
+                                 flags=re.MULTILINE)
+pattern_url2_rapide = re.compile(r'(?<!\w)' + pattern_url2.pattern, flags=re.MULTILINE)
+
+# Passes du nettoyage initial: (catégorie comptée, motif, ancres dont une doit être présente)
+NETTOYAGE = [
+    (None, pattern_reply, ['>']),
+    ('MAIL', pattern_mail_rapide, ['@']),
+    ('URL', pattern_url1_rapide, ['://']),
+    ('URL', pattern_url2_rapide, ['.']),
+    ('TEL', pattern_tel1, ['(']),
+    ('TEL', pattern_tel2, ['+']),
+    ('PRIX', pattern_prix1, list(MONNAIE)),
+    ('PRIX', pattern_prix2, list(MONNAIE)),
+    ('NOMBRE', pattern_nb, None),
+    (None, pattern_ponct, None)
+]
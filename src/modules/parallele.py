@@ -0,0 +1,266 @@
+# coding: utf-8
+"""
+Module d'exécution parallèle des étapes.
+
+Chaque processus du pool reçoit la configuration une seule fois à son initialisation et ouvre
+ses connexions aux bases à la première demande: les tâches ne transportent que leurs données.
+Les tâches sont envoyées par lots dont la taille est calculée selon leur nombre, une tâche en
+échec est journalisée et remplacée par None sans interrompre l'étape.
+"""
+
+import functools
+import logging
+import multiprocessing
+import threading
+import time
+
+import tqdm
+from src.modules import cmd_mongo
+from src.modules import cmd_psql
+
+logger = logging.getLogger(__name__)
+
+LOTS_PAR_PROCESSUS = 4
+LOT_MAX = 64
+LOT_FLUX = 16
+
+CONF = None
+BARRIERE = None
+CONNEXIONS = {}
+
+
+def init_processus(conf, barriere, initialisation=None, initargs=()):
+    """
+    Initialise un processus du pool
+    :param conf: <Settings>
+    :param barriere: <multiprocessing.Barrier> synchronisation des diffusions
+    :param initialisation: <function> initialisation propre à l'étape
+    :param initargs: <tuple> arguments de l'initialisation de l'étape
+    """
+    global CONF, BARRIERE  # pylint: disable=global-statement
+    CONF = conf
+    BARRIERE = barriere
+    CONNEXIONS.clear()
+    if initialisation:
+        initialisation(*initargs)
+
+
+def get_psql():
+    """
+    Connexion psql du processus, ouverte au premier appel
+    :return: <psycopg2.extension.connection>
+    """
+    if 'psql' not in CONNEXIONS:
+        CONNEXIONS['psql'] = cmd_psql.connect_db(user=CONF.infra['psql']['user'],
+                                                 passwd=CONF.infra['psql']['pass'],
+                                                 host=CONF.infra['psql']['host'],
+                                                 port=CONF.infra['psql']['port'],
+                                                 dbname=CONF.infra['psql']['db'])
+    return CONNEXIONS['psql']
+
+
+def get_mongo():
+    """
+    Client mongo du processus, ouvert au premier appel
+    :return: <pymongo.MongoClient>
+    """
+    if 'mongo' not in CONNEXIONS:
+        CONNEXIONS['mongo'] = cmd_mongo.connect(CONF)
+    return CONNEXIONS['mongo']
+
+
+def fermer_connexions():
+    """
+    Ferme les connexions ouvertes par le processus
+    """
+    for client in CONNEXIONS.values():
+        if client is not None:
+            client.close()
+    CONNEXIONS.clear()
+
+
+def taille_lot(total, processus, fenetre=None):
+    """
+    Taille des lots de tâches envoyés aux processus: quelques lots par processus pour équilibrer
+    la charge, un lot fixe pour un flux de taille inconnue. Un lot ne dépasse pas la moitié de la
+    part de fenêtre d'un processus pour ne jamais bloquer le flux.
+    :param total: <int|None> nombre de tâches
+    :param processus: <int>
+    :param fenetre: <int|None> nombre maximal de tâches en cours
+    :return: <int>
+    """
+    lot = LOT_FLUX if total is None else total // (processus * LOTS_PAR_PROCESSUS)
+    if fenetre:
+        lot = min(lot, fenetre // (processus * 2))
+    return max(1, min(lot, LOT_MAX))
+
+
+def flux_borne(iterable, semaphore, arret):
+    """
+    Limite le nombre d'éléments en cours de traitement.
+    Le générateur bloque tant que la fenêtre est pleine, le consommateur libère une place à
+    chaque résultat récupéré. Il s'interrompt dès que l'arrêt est demandé.
+    :param iterable: <iterable>
+    :param semaphore: <threading.Semaphore>
+    :param arret: <threading.Event>
+    :return: <generator>
+    """
+    for element in iterable:
+        semaphore.acquire()
+        if arret.is_set():
+            return
+        yield element
+
+
+def arreter_flux(semaphore, arret, fenetre):
+    """
+    Interrompt un flux borné: le thread du pool qui l'alimente ne reste pas bloqué sur une
+    fenêtre pleine quand le consommateur s'arrête en cours de route
+    :param semaphore: <threading.Semaphore>
+    :param arret: <threading.Event>
+    :param fenetre: <int> taille de la fenêtre
+    """
+    arret.set()
+    semaphore.release(fenetre)
+
+
+def tache_protegee(fonction, tache):
+    """
+    Exécute une tâche en capturant son erreur
+    :param fonction: <function>
+    :param tache: <any>
+    :return: <tuple> (<bool> succès, <any> résultat)
+    """
+    try:
+        return True, fonction(tache)
+    except Exception as err:  # pylint: disable=broad-except
+        logger.exception("Echec de la tâche %s - %s", getattr(fonction, '__name__', fonction),
+                         err)
+        return False, None
+
+
+def diffusion(fonction, _):
+    """
+    Exécute une fonction dans un processus puis attend que tous les processus aient reçu la
+    leur: aucun processus ne peut en recevoir deux
+    :param fonction: <function> sans argument
+    :param _: <int> numéro de la tâche
+    :return: <any>
+    """
+    try:
+        return fonction()
+    finally:
+        BARRIERE.wait()
+
+
+def bilan(desc, nombre, echecs, duree, lot):
+    """
+    Journalise le bilan d'un traitement
+    :param desc: <str> libellé du traitement
+    :param nombre: <int> nombre de tâches traitées
+    :param echecs: <int> nombre de tâches en échec
+    :param duree: <float> secondes
+    :param lot: <int> taille des lots
+    """
+    logger.info("%s - %s tâches en %.1fs - %.1f tâches/s - lots de %s", desc, nombre, duree,
+                nombre / duree if duree else 0, lot)
+    if echecs:
+        logger.warning("%s - tâches en échec - %s", desc, echecs)
+
+
+class Executeur:
+    """
+    Pool de processus d'une étape.
+    Utilisé comme gestionnaire de contexte, les connexions des processus sont fermées à la sortie.
+    """
+    def __init__(self, conf, initialisation=None, initargs=(), processus=None):
+        self.conf = conf
+        self.processus = processus or conf.infra['cpu_available']
+        self.initialisation = initialisation
+        self.initargs = initargs
+        self.pool = None
+        self.flux = {}
+
+    def __enter__(self):
+        barriere = multiprocessing.Barrier(self.processus)
+        self.pool = multiprocessing.Pool(self.processus, initializer=init_processus,
+                                         initargs=(self.conf, barriere, self.initialisation,
+                                                   self.initargs))
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # Le thread qui alimente le pool ne doit plus attendre un flux abandonné: terminate()
+        # l'attend et les diffusions passent derrière lui
+        for flux in self.flux.values():
+            arreter_flux(*flux)
+        self.flux.clear()
+        if exc_type is None:
+            self.diffuser(fermer_connexions)
+            self.pool.close()
+            self.pool.join()
+        else:
+            self.pool.terminate()
+        self.pool = None
+
+    def borner(self, taches, fenetre):
+        """
+        Borne un flux de tâches, le flux est interrompu à la sortie du gestionnaire de contexte
+        :param taches: <iterable>
+        :param fenetre: <int> nombre maximal de tâches en cours
+        :return: <tuple> (<generator> tâches, <threading.Semaphore> libéré à chaque résultat)
+        """
+        semaphore = threading.Semaphore(fenetre)
+        arret = threading.Event()
+        self.flux[id(semaphore)] = (semaphore, arret, fenetre)
+        return flux_borne(taches, semaphore, arret), semaphore
+
+    # Les options varient d'un appel à l'autre sur un même pool (flux borné puis fusion ordonnée)
+    # pylint: disable-next=too-many-arguments
+    def traiter(self, fonction, taches, desc, *, total=None, ordonne=True, fenetre=None):
+        """
+        Traite les tâches dans les processus et renvoie les résultats au fil de l'eau
+        :param fonction: <function> fonction de niveau module appliquée à chaque tâche
+        :param taches: <iterable>
+        :param desc: <str> libellé de la progression
+        :param total: <int> nombre de tâches, déduit de la liste si possible
+        :param ordonne: <bool> résultats dans l'ordre des tâches
+        :param fenetre: <int> nombre maximal de tâches en cours, pour un flux
+        :return: <generator> résultats, None pour une tâche en échec
+        """
+        if total is None and hasattr(taches, '__len__'):
+            total = len(taches)
+
+        semaphore = None
+        if fenetre:
+            taches, semaphore = self.borner(taches, fenetre)
+
+        lot = taille_lot(total, self.processus, fenetre)
+        resultats = (self.pool.imap if ordonne else self.pool.imap_unordered)(
+            functools.partial(tache_protegee, fonction), taches, chunksize=lot)
+
+        nombre = 0
+        echecs = 0
+        debut = time.perf_counter()
+        try:
+            for succes, resultat in tqdm.tqdm(resultats, desc=desc, total=total, leave=False,
+                                              disable=self.conf.args['progress_bar']):
+                if semaphore:
+                    semaphore.release()
+                nombre += 1
+                echecs += not succes
+                yield resultat
+        finally:
+            # Le flux a pu être interrompu par la sortie du gestionnaire de contexte
+            if id(semaphore) in self.flux:
+                arreter_flux(*self.flux.pop(id(semaphore)))
+
+        bilan(desc, nombre, echecs, time.perf_counter() - debut, lot)
+
+    def diffuser(self, fonction):
+        """
+        Exécute une fonction sans argument une fois dans chaque processus
+        :param fonction: <function> fonction de niveau module
+        :return: <list> résultats de chaque processus
+        """
+        return self.pool.map(functools.partial(diffusion, fonction), range(self.processus),
+                             chunksize=1)
@@ -0,0 +1,127 @@
+# coding: utf-8
+"""
+Module de planification des messages à traiter par les étapes features, nlp et vecteurs.
+
+Une seule requête ensembliste par étape donne les messages à traiter (hash, id_message,
+categorie) de la langue. Les documents mongo correspondants sont ensuite lus par lots de hash:
+les processus ne reçoivent que des documents à traiter, déjà identifiés, et n'interrogent plus
+la base pour chaque message.
+"""
+
+import json
+import logging
+
+from src.modules import cmd_mongo
+from src.modules import cmd_psql
+
+logger = logging.getLogger(__name__)
+
+LOT_HASH = 1000
+CHAMPS_PLAN = ('id_message', 'categorie')
+
+
+def requete_plan(conf, etape, parametres=None):
+    """
+    Requête des messages à traiter d'une étape
+    :param conf: <Settings>
+    :param etape: <str> clé de la requête dans 'planification'
+    :param parametres: <dict> valeurs des autres champs de la requête que la langue
+    :return: <str>
+    """
+    with open(conf.infra['psql']['queries'], 'r', encoding='utf-8') as file:
+        queries = json.load(file)
+    return queries['planification'][etape].format(langue=conf.args['langue'],
+                                                  **(parametres or {}))
+
+
+def compte(conf, etape, parametres=None):
+    """
+    Nombre de messages à traiter d'une étape
+    :param conf: <Settings>
+    :param etape: <str>
+    :param parametres: <dict>
+    :return: <int|None>
+    """
+    client_psql = cmd_psql.connect_db(user=conf.infra['psql']['user'],
+                                      passwd=conf.infra['psql']['pass'],
+                                      host=conf.infra['psql']['host'],
+                                      port=conf.infra['psql']['port'],
+                                      dbname=conf.infra['psql']['db'])
+    requete = requete_plan(conf, etape, parametres)
+    result = cmd_psql.exec_query(client_psql, f"SELECT COUNT(*) FROM ({requete}) plan")
+    client_psql.close()
+    if result == -1:
+        return None
+    return result[0][0]
+
+
+def plan(conf, etape, parametres=None):
+    """
+    Parcourt les messages à traiter d'une étape
+    :param conf: <Settings>
+    :param etape: <str>
+    :param parametres: <dict>
+    :return: <generator> de <tuple> (<str> hash, <int> id_message, <str> categorie, ...)
+    """
+    client_psql = cmd_psql.connect_db(user=conf.infra['psql']['user'],
+                                      passwd=conf.infra['psql']['pass'],
+                                      host=conf.infra['psql']['host'],
+                                      port=conf.infra['psql']['port'],
+                                      dbname=conf.infra['psql']['db'])
+    try:
+        yield from cmd_psql.iter_query(client_psql, requete_plan(conf, etape, parametres))
+    finally:
+        client_psql.close()
+
+
+def par_lots(iterable, taille):
+    """
+    Regroupe les éléments d'un itérable en listes
+    :param iterable: <iterable>
+    :param taille: <int>
+    :return: <generator> de <list>
+    """
+    lot = []
+    for element in iterable:
+        lot.append(element)
+        if len(lot) == taille:
+            yield lot
+            lot = []
+    if lot:
+        yield lot
+
+
+def documents_a_traiter(conf, etape, taille=LOT_HASH, parametres=None, champs=CHAMPS_PLAN):
+    """
+    Joint le plan d'une étape aux documents mongo: chaque lot de hash est recherché dans les
+    collections, un document n'est renvoyé qu'une fois
+    :param conf: <Settings>
+    :param etape: <str>
+    :param taille: <int> nombre de hash par requête mongo
+    :param parametres: <dict> paramètres de la requête du plan
+    :param champs: <tuple> noms des colonnes du plan après le hash, ajoutées au document
+    :return: <generator> de <dict> {'_id', 'message', 'id_message', 'categorie', ...}
+    """
+    client = cmd_mongo.connect(conf)
+    collections = [client[conf.infra['mongo']['db']][nom]
+                   for nom in conf.infra['mongo']['collection']]
+    absents = 0
+    try:
+        for lot in par_lots(plan(conf, etape, parametres), taille):
+            messages = {hash_doc: valeurs for hash_doc, *valeurs in lot}
+            for collection in collections:
+                if not messages:
+                    break
+                for document in cmd_mongo.iter_documents(
+                        collection, d_filter={'_id': {'$in': list(messages)}},
+                        include=['_id', 'message']):
+                    if document['_id'] not in messages:
+                        continue
+                    document.update(zip(champs, messages.pop(document['_id'])))
+                    yield document
+            absents += len(messages)
+    finally:
+        client.close()
+
+    if absents:
+        logger.warning("%s messages à traiter absents de mongo", absents)
@@ -2,82 +2,130 @@
 """
 Code pour la phase de fouille de données
 """
-import multiprocessing
 import logging
-import queue
-import tqdm
+from collections import Counter
 
 from src.modules import cmd_sqlite
-from src.modules import importation
+from src.modules import esquisse
 
 logger = logging.getLogger(__name__)
 
 
-def fouille_wc(data_stack, conf, stage):
+ETAPES = ['récolte', 'création', 'mise_en_base']
+INCREMENT = ' (incrément)'
+COMPTAGES = {}
+ESQUISSE = False
+
+
+def init_word_count(par_esquisse=False):
     """
-    Calcule le nombre de mots et mots uniques lors de la phase de fouille
-    Stocke directement les informations dans la base SQLite
-    :param data_stack: <dict>
-    :param conf: <Settings>
-    :param stage: <str>
-    :return: <None>
+    Initialise les compteurs d'un processus
+    :param par_esquisse: <bool> compte le vocabulaire par esquisses à mémoire bornée
     """
-    manager = multiprocessing.Manager()
-    shared_queue = manager.Queue()
+    global ESQUISSE  # pylint: disable=global-statement
+    ESQUISSE = par_esquisse
+    COMPTAGES.clear()
 
-    logger.info("Word Count %s début", stage)
-    match stage:
-        case 'récolte':
-            pool_args = [(file, cat, shared_queue, stage) for cat, f_list in data_stack.items()
-                         for file in list(f_list)]
 
-        case 'création' | 'mise_en_base':
-            pool_args = [(doc['message'], doc['categorie'], shared_queue, stage) for doc in
-                         data_stack]
+def compter(stage, cat, mots):
+    """
+    Ajoute un mail et ses mots aux compteurs du processus
+    :param stage: <str>
+    :param cat: <str>
+    :param mots: <list|None> None si le texte du mail est illisible
+    """
+    if stage not in COMPTAGES:
+        COMPTAGES[stage] = (Counter(), {})
+    mails, compteurs = COMPTAGES[stage]
+    mails[cat] += 1
+    if not mots:
+        return
 
-        case _:
-            logger.error("Etape inconnue %s pour le word_count", stage)
-            return
+    if cat not in compteurs:
+        compteurs[cat] = esquisse.Vocabulaire() if ESQUISSE else Counter()
+    compteurs[cat].update(mots)
 
-    with multiprocessing.Pool(conf.infra['cpu_available']) as pool:
-        list(tqdm.tqdm(pool.imap(word_count_args, pool_args),
-                       desc=f"Word count progress {stage}...",
-                       leave=False,
-                       disable=conf.args['progress_bar']))
 
-    words_count = process_queue(shared_queue)
-    to_save = prepare_to_save(words_count, pool_args, stage)
-    store_word_count(to_save, conf)
-    logger.info("Word count %s fin", stage)
+def mots_bruts(raw, chemin):
+    """
+    Mots du contenu brut d'un mail tel que lu lors de la récolte
+    :param raw: <bytes|mmap.mmap|memoryview>
+    :param chemin: <str>
+    :return: <list|None> None si le contenu n'est pas de l'utf-8
+    """
+    try:
+        return bytes(raw).decode('utf-8').split()
+    except UnicodeError as err:
+        logger.debug("Fichier %s - %s", chemin, err)
+        return None
 
 
-def process_queue(shared_queue):
+def rendre_comptage():
     """
-    Fonction qui compte les occurrences de chaque mot.
-    :param shared_queue: <Queue>
+    Renvoie les compteurs du processus
+    :return: <dict> {<str> étape: (<Counter> mails par catégorie, <dict> {<str> catégorie:
+    <Counter|Vocabulaire>})}
     """
-    words_count = {}
-    while not shared_queue.empty():
-        q_element = shared_queue.get()
-        cat = list(q_element.keys())[0]
+    return COMPTAGES
 
-        if cat not in words_count:
-            words_count[cat] = {}
 
-        for mot, iteration in q_element[cat].items():
-            if mot not in words_count[cat]:
-                words_count[cat][mot] = iteration
-            else:
-                words_count[cat][mot] += iteration
+def fusion(comptages):
+    """
+    Fusionne des comptages
+    :param comptages: <list> de <dict> {<str> étape: (<Counter>, <dict>)}
+    :return: <dict>
+    """
+    resultat = comptages[0]
+    for autre in comptages[1:]:
+        for stage, (autres_mails, autres_mots) in autre.items():
+            if stage not in resultat:
+                resultat[stage] = (autres_mails, autres_mots)
+                continue
+            mails, mots = resultat[stage]
+            mails.update(autres_mails)
+            for cat, compteur in autres_mots.items():
+                if cat in mots:
+                    mots[cat].update(compteur)
+                else:
+                    mots[cat] = compteur
+    return resultat
+
+
+def reduction(executeur, comptages):
+    """
+    Réduit les comptages des processus en arbre: les comptages sont fusionnés deux à deux en
+    parallèle à chaque tour
+    :param executeur: <Executeur>
+    :param comptages: <list> de <dict> {<str> étape: (<Counter>, <dict>)}
+    :return: <dict>
+    """
+    while len(comptages) > 1:
+        paires = [comptages[i:i + 2] for i in range(0, len(comptages), 2)]
+        comptages = list(executeur.traiter(fusion, paires, desc="Fusion des comptages"))
+    return comptages[0]
+
 
-    return words_count
+def store_comptages(comptages, conf, etapes=None, incrementale=False):
+    """
+    Enregistre les comptages de chaque étape, une étape sans mail est enregistrée à zéro.
+    Les comptages d'une fouille incrémentale ne portent que sur les fichiers nouveaux et non sur
+    tout le corpus: leurs étapes sont suffixées par INCREMENT.
+    :param comptages: <dict> {<str> étape: (<Counter>, <dict>)}
+    :param conf: <Settings>
+    :param etapes: <list> étapes à enregistrer dans l'ordre, toutes par défaut
+    :param incrementale: <bool> fouille limitée aux fichiers absents du manifeste
+    """
+    for stage in etapes or ETAPES:
+        mails, words_count = comptages.get(stage, (Counter(), {}))
+        etiquette = f'{stage}{INCREMENT}' if incrementale else stage
+        store_word_count(prepare_to_save(words_count, mails, etiquette), conf)
 
 
-def prepare_to_save(words_count, pool_args, stage):
+def prepare_to_save(words_count, mails, stage):
     """
     Préparation des données à sauvegarder
-    :param words_count: <dict>
-    :param pool_args: <int>
+    :param words_count: <dict> {<str> catégorie: <Counter|Vocabulaire>}
+    :param mails: <Counter> nombre de mails par catégorie
     :param stage: <str>
     :return: <dict>
     """
@@ -85,9 +133,9 @@ def prepare_to_save(words_count, pool_args, stage):
     for cat, words in words_count.items():
         to_save[cat] = {
             'etape': stage,
-            'mails': len([arg for arg in pool_args if arg[1] == cat]),
-            'mots': sum(iteration for iteration in words.values()),
-            'mots_uniques': len(words.keys())
+            'mails': mails[cat],
+            'mots': words.total(),
+            'mots_uniques': len(words)
         }
 
     to_save['globales'] = {'etape': stage, 'mails': 0, 'mots': 0, 'mots_uniques': 0}
@@ -99,44 +147,6 @@ def prepare_to_save(words_count, pool_args, stage):
     return to_save
 
 
-def word_count_args(pool_arg):
-    """
-    Compte les mots d'un mail d'une catégorie et ajoute le comptage
-    word_count format : {'ham' : {'foo' : 1, 'bar' : 2}}
-    :param pool_arg: <list> [<str>, <str>, <dict>]
-    :return: <None>
-    """
-    source = pool_arg[0]
-    cat = pool_arg[1]
-    words_queue = pool_arg[2]
-    stage = pool_arg[3]
-    word_count = {cat: {}}
-
-    match stage:
-        case 'récolte':
-            mots = importation.get_text_file(source).split()
-        case 'création' | 'mise_en_base':
-            mots = source.split()
-        case _:
-            logger.error('Etape inconnue pour word_count - %s', stage)
-            return
-
-    if not mots:
-        return
-
-    for mot in mots:
-        if mot not in word_count[cat]:
-            word_count[cat][mot] = 1
-        else:
-            word_count[cat][mot] += 1
-
-    try:
-        words_queue.put(word_count, timeout=2)
-    except queue.Full as err:
-        logger.error("Queue WordCounts pleine. Essayez avec moins de données - %s", err)
-        return
-
-
 def store_word_count(data, conf):
     """
     Store word count information into database:
@@ -44,38 +44,7 @@ def args_handler():
                             action='store_true',
                             default=False)
 
-    parser_fouille = subparsers.add_parser('fouille',
-                                           help="Réalisation des actions de fouille de données")
-    parser_fouille.add_argument('collection',
-                                help='Collection mongo ou stocker les documents',
-                                nargs=1,
-                                choices=['spamassassin', 'kaamelott'])
-
-    parser_fouille.add_argument('-s', '--stats',
-                                help='Affiche et stocke les données en cours de traitement',
-                                action='store_true',
-                                default=False)
-
-    parser_fouille.add_argument("-g", "--graph",
-                                help="Affiche les données statistiques sous forme de graph",
-                                action='store_true',
-                                default=False)
-
-    source = parser_fouille.add_argument_group("source de données")
-    source.add_argument(
-        "-a", "--ham",
-        dest='ham',
-        help="Dossier contenant les mails légitimes",
-        metavar="DOSSIER_HAM",
-        nargs='*'
-    )
-    source.add_argument(
-        "-p", "--spam",
-        dest="spam",
-        help="Dossier contenant les mails frauduleux",
-        metavar="DOSSIER_SPAM",
-        nargs='*'
-    )
+    args_fouille(subparsers)
 
     parser_features = subparsers.add_parser('features',
                                             help="Recherche des caractéristiques")
@@ -95,6 +64,11 @@ def args_handler():
                                  help="Affiche les données statistiques sous forme de graph",
                                  action='store_true',
                                  default=False)
+    parser_features.add_argument("-L", "--lot",
+                                 help="Recalcule par lots en colonnes les caractéristiques de "
+                                      "tous les messages, déjà traités compris",
+                                 action='store_true',
+                                 default=False)
 
     parser_nlp = subparsers.add_parser('nlp', help='Traitement du langage naturel')
 
@@ -114,6 +88,12 @@ def args_handler():
                             action='store_true',
                             default=False)
 
+    parser_nlp.add_argument('-t', '--taille-lot',
+                            help="Nombre de messages par appel à stanza, 1 pour un appel par "
+                                 "message",
+                            type=int,
+                            default=32)
+
     parser_vecteurs = subparsers.add_parser('vecteurs',
                                             help="Vectorise les documents")
 
@@ -189,3 +169,76 @@ def args_handler():
 
     subparsers.required = True
     return parser.parse_args()
+
+
+def args_fouille(subparsers):
+    """
+    Arguments de l'étape de fouille
+    :param subparsers: <argparse._SubParsersAction>
+    """
+    parser_fouille = subparsers.add_parser('fouille',
+                                           help="Réalisation des actions de fouille de données")
+    parser_fouille.add_argument('collection',
+                                help='Collection mongo ou stocker les documents',
+                                nargs=1,
+                                choices=['spamassassin', 'kaamelott'])
+
+    parser_fouille.add_argument('-s', '--stats',
+                                help='Affiche et stocke les données en cours de traitement, '
+                                     'limitées aux fichiers nouveaux sans --force',
+                                action='store_true',
+                                default=False)
+
+    parser_fouille.add_argument("-g", "--graph",
+                                help="Affiche les données statistiques sous forme de graph",
+                                action='store_true',
+                                default=False)
+
+    parser_fouille.add_argument("-f", "--force",
+                                help="Ignore le manifeste et traite à nouveau tous les fichiers",
+                                action='store_true',
+                                default=False)
+
+    parser_fouille.add_argument("-t", "--taille-max",
+                                help="Taille maximale en Ko des fichiers des dossiers",
+                                dest='taille_max',
+                                type=int,
+                                default=None)
+
+    parser_fouille.add_argument("-e", "--extensions",
+                                help="Extensions des fichiers des dossiers à traiter (.eml ...)",
+                                nargs='*',
+                                default=None)
+
+    parser_fouille.add_argument("-m", "--max-corps",
+                                help="Taille maximale en Ko du corps extrait de chaque mail",
+                                dest='max_corps',
+                                type=int,
+                                default=None)
+
+    parser_fouille.add_argument("-d", "--ecriture-directe",
+                                help="Chaque processus insère lui-même ses documents en base",
+                                dest='ecriture_directe',
+                                action='store_true',
+                                default=False)
+
+    parser_fouille.add_argument("-k", "--esquisse",
+                                help="Statistiques du vocabulaire par esquisses à mémoire bornée",
+                                action='store_true',
+                                default=False)
+
+    source = parser_fouille.add_argument_group("source de données")
+    source.add_argument(
+        "-a", "--ham",
+        dest='ham',
+        help="Dossiers, maildir, mbox ou archives (tar, zip) contenant les mails légitimes",
+        metavar="DOSSIER_HAM",
+        nargs='*'
+    )
+    source.add_argument(
+        "-p", "--spam",
+        dest="spam",
+        help="Dossiers, maildir, mbox ou archives (tar, zip) contenant les mails frauduleux",
+        metavar="DOSSIER_SPAM",
+        nargs='*'
+    )
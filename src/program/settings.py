@@ -50,6 +50,8 @@ def init_log(debug):
             'src.modules.cmd_docker', 'src.modules.cmd_sqlite', 'src.modules.cmd_mongo',
             'src.modules.cmd_psql', 'src.modules.word_count', 'src.modules.importation',
             'src.modules.transformation', 'src.modules.nettoyage', 'src.modules.graph',
+            'src.modules.empreinte', 'src.modules.langue', 'src.modules.parallele',
+            'src.modules.esquisse', 'src.modules.planification',
             'src.annexes.zipf']
     for module in mods:
         m_logger = logging.getLogger(module)
@@ -154,6 +156,7 @@ class Settings:
                 self.args['graph'] = arguments.graph
                 self.args['langue'] = arguments.langue[0]
                 self.args['stats'] = arguments.stats
+                self.args['lot'] = arguments.lot
                 self.infra['mongo']['collection'] = arguments.collection
                 for cont in self.infra['containers']:
                     if not cmd_docker.container_up(cont):
@@ -162,6 +165,7 @@ class Settings:
 
             case 'nlp':
                 self.args['stats'] = arguments.stats
+                self.args['taille_lot'] = max(1, arguments.taille_lot)
                 self.args['langue'] = arguments.langue[0]
                 self.infra['mongo']['collection'] = arguments.collection
                 for cont in self.infra['containers']:
@@ -174,6 +178,14 @@ class Settings:
                 self.args['spam'] = arguments.spam
                 self.args['graph'] = arguments.graph
                 self.args['stats'] = arguments.stats
+                self.args['force'] = arguments.force
+                self.args['taille_max'] = arguments.taille_max * 1024 \
+                    if arguments.taille_max else None
+                self.args['extensions'] = arguments.extensions
+                self.args['max_corps'] = arguments.max_corps * 1024 \
+                    if arguments.max_corps else None
+                self.args['ecriture_directe'] = arguments.ecriture_directe
+                self.args['esquisse'] = arguments.esquisse
                 self.infra['mongo']['collection'] = arguments.collection[0]
 
                 for cont in self.infra['containers']:
@@ -8,7 +8,6 @@ import re
 import nltk
 import logging
 import hashlib
-import langdetect
 import joblib
 
 import stanza
@@ -17,10 +16,11 @@ import pandas as pd
 
 from src.modules import importation
 from src.modules import nettoyage
+from src.modules import langue
 from src.modules import cmd_psql
 from src.modules import cmd_mongo
 from src.annexes import zipf
-from src.stages.features import features_ponctuations, features_mots, features_zipf, features_hapax
+from src.stages.features import features_texte, fonctions_requises, colonne_modele
 from src.stages.nlp import lemmatise
 from src.stages.train import normalize
 
@@ -44,10 +44,9 @@ def main(conf):
         logger.warning("Echec de récupération du corps de %s", conf.args['mail'])
         return
 
-    try:
-        lang = langdetect.detect(body).split()[0]
-    except langdetect.lang_detect_exception.LangDetectException as err:
-        logger.error("Echec de détection de la langue pour %s %s", conf.args['mail'], err)
+    lang = langue.detecter(body)
+    if lang is None:
+        logger.error("Echec de détection de la langue pour %s", conf.args['mail'])
         return
 
     new_doc = {
@@ -59,11 +58,15 @@ def main(conf):
         'liens': liens
     }
 
+    mgo_client = cmd_mongo.connect(conf)
+    m_collection = mgo_client[conf.infra['mongo']['db']][conf.infra['mongo']['models']]
+    m_docs = {name: list(m_collection.find({'name': name}))[0] for name in conf.args['models']}
+
     logger.info("Recherche des caractéristiques")
-    fonctions = [features_ponctuations, features_mots, features_zipf, features_hapax]
+    fonctions = fonctions_requises(col for m_doc in m_docs.values() for col in m_doc['colonnes'])
     features = {}
-    for fonction in fonctions:
-        features.update(fonction(body))
+    for table in features_texte(body, fonctions).values():
+        features.update(table)
 
     logger.info("Traitement NLP")
     nltk.download("stopwords", quiet=True)
@@ -111,25 +114,14 @@ def main(conf):
     data.update(new_doc['liens'])
     data.update(features)
 
-    for key in list(data.keys()):
-        if key == 'nombre_hapax':
-            data['hapax'] = data.pop(key)
-            continue
-        if key == 'ratio_mots_uniques':
-            data['hapax_uniques'] = data.pop(key)
-            continue
-        data[key.lower()] = data.pop(key)
-
+    data = {colonne_modele(key): value for key, value in data.items()}
     base_df = pd.DataFrame(data, index=[0])
 
-    mgo_client = cmd_mongo.connect(conf)
-    m_collection = mgo_client[conf.infra['mongo']['db']][conf.infra['mongo']['models']]
-
     logger.info("Evaluation")
     scaler = None
     models = {name: f"{conf.infra['storage']}/{name}.pkl" for name in conf.args['models']}
     for model_name, path in models.items():
-        m_doc = list(m_collection.find({'name': model_name}))[0]
+        m_doc = m_docs[model_name]
         if path != m_doc['chemin']:
             logger.error('Les chemins pour le modèle %s ne correspondent pas %s <> %s', model_name,
                          path, m_doc['chemin'])
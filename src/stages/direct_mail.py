@@ -13,7 +13,6 @@ import email.header
 import socket
 import sys
 import requests.exceptions
-import langdetect
 
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
@@ -21,6 +20,7 @@ from requests.auth import HTTPBasicAuth
 
 from src.modules import importation, cmd_mongo
 from src.modules import nettoyage
+from src.modules import langue
 from src.stages.kaamelott import previous_eval, features_process, nlp_process, vecteur_process, \
     ai_eval
 
@@ -147,10 +147,9 @@ def preprocess_mail(conf, imap, mail_id):
             mail_data['target']['result'] = conf.infra['comments']['empty_body'][dft_lang]
             break
 
-        try:
-            lang = langdetect.detect(body).split()[0]
-        except langdetect.lang_detect_exception.LangDetectException as err:
-            logger.error("Echec de détection de la langue pour %s %s", sujet, err)
+        lang = langue.detecter(body)
+        if lang is None:
+            logger.error("Echec de détection de la langue pour %s", sujet)
             mail_data['target']['success'] = False
             mail_data['target']['result'] = conf.infra['comments']['lang_detect_failed'][dft_lang]
             break
@@ -194,7 +193,7 @@ def direct_mail_eval(conf, mail):
         logger.info("Aucun nouveau traitement à effectuer pour %s", mail['source']['subject'])
         return
 
-    feats = features_process(mail['target']['document'])
+    feats = features_process(mail['target']['document'], models=models)
     bag = nlp_process(conf, mail['target']['document'], mail['target'])
     vecteur = vecteur_process(conf, bag, mail['target']['document'], mail['target'])
     if not vecteur:
@@ -3,20 +3,40 @@
 Code pour la phase de recherche de caractéristiques
 """
 import datetime
+import functools
+import json
 import re
+import string
 import logging
-import multiprocessing
+from collections import Counter
 import tqdm
+import numpy as np
 import pandas as pd
 
 from src.modules import cmd_psql
-from src.modules import cmd_mongo
 from src.modules import graph
+from src.modules import parallele
+from src.modules import planification
 from src.annexes import zipf
 
 
 logger = logging.getLogger(__name__)
 
+MOT = re.compile(r'\w+', re.MULTILINE)
+LIGNE_VIDE = re.compile(r'^\s*$', re.MULTILINE)
+CAPITALISE = re.compile(r'[A-Z][a-z]+')
+MINUSCULES = string.ascii_lowercase.encode()
+MAJUSCULES = string.ascii_uppercase.encode()
+
+FENETRE = 1000
+LOT_DOCUMENTS = 1000
+OCTETS = {
+    'features_ponctuations': {'point': b'.', 'virgule': b',', 'exclamation': b'!',
+                              'interrogation': b'?', 'tabulation': b'\t', 'espace': b' ',
+                              'ligne': b'\n'},
+    'features_mots': {'char_minuscules': MINUSCULES, 'char_majuscules': MAJUSCULES}
+}
+
 
 def main(conf):
     """
@@ -29,87 +49,73 @@ def main(conf):
     logger.info("Miser à jour de la base psql")
     cmd_psql.apply_databases_updates(conf, conf.infra['psql']['schema']['features'])
 
-    all_docs = get_all_mails(conf)
-    logger.info("Traitement statistique sur %s documents", len(all_docs))
-
-    fonctions = [features_ponctuations, features_mots, features_zipf, features_hapax]
-    pool_args = [(conf, entry, fonctions) for entry in all_docs]
-    with multiprocessing.Pool(conf.infra['cpu_available']) as pool:
-        result = list(tqdm.tqdm(pool.imap(features_pipeline, pool_args),
-                                desc="Traitement statistique",
-                                leave=False,
-                                total=len(pool_args),
-                                disable=conf.args['progress_bar']))
-    result = [entry for entry in result if entry]
-
-    if result:
-        mise_en_base(result, conf)
+    if conf.args['lot']:
+        features_lots(conf)
     else:
-        logger.info("Aucun fichier à traiter")
+        parametres = parametres_plan()
+        total = planification.compte(conf, 'features', parametres)
+        logger.info("Traitement statistique sur %s documents", total)
+        fonctions = fonctions_requises()
+        with parallele.Executeur(conf) as executeur:
+            result = [entry for entry in executeur.traiter(
+                functools.partial(features_pipeline, fonctions),
+                planification.documents_a_traiter(conf, 'features', parametres=parametres,
+                                                  champs=CHAMPS_PLAN),
+                desc="Traitement statistique", total=total, fenetre=FENETRE) if entry]
+
+        if result:
+            mise_en_base(result, conf)
+        else:
+            logger.info("Aucun fichier à traiter")
 
     if conf.args['stats']:
         features_stats(conf)
     logger.info("Fin de la recherche des caractéristiques")
 
 
-def get_all_mails(conf):
+def parametres_plan():
     """
-    Récupère tous les mails de la base mongo.
-    :param conf: <Settings>
-    :return: <list> of dict
+    Paramètres de la requête du plan: version courante de chaque famille de caractéristiques
+    :return: <dict>
     """
-    documents = []
-    for arg_collection in conf.infra['mongo']['collection']:
-        logger.info("Récupération des documents dans %s", arg_collection)
-        client = cmd_mongo.connect(conf)
-        collection = client[conf.infra['mongo']['db']][arg_collection]
-        documents += cmd_mongo.get_all_documents(collection,
-                                                 d_filter={'langue': conf.args['langue']},
-                                                 include=['_id', 'message'])
-        client.close()
-
-    return documents
+    return {'versions': ', '.join(f"('{table}', {feature['version']})"
+                                  for table, feature in FEATURES.items())}
 
 
-def features_pipeline(pool_args):
+def features_pipeline(fonctions, entry):
     """
-    Pipeline du traitement des données statistiques pour un message
-    :param pool_args: <tuple>
-    :return: <None>
+    Pipeline du traitement des données statistiques pour un message, seules les familles dont
+    la version en base est périmée sont calculées
+    :param fonctions: <list> fonctions de calcul des caractéristiques
+    :param entry: <dict> document mongo à traiter, avec son id_message et ses familles
+    :return: <dict>
     """
-    conf = pool_args[0]
-    entry = pool_args[1]
-    fonctions = pool_args[2]
-    client_psql = cmd_psql.connect_db(user=conf.infra['psql']['user'],
-                                      passwd=conf.infra['psql']['pass'],
-                                      host=conf.infra['psql']['host'],
-                                      port=conf.infra['psql']['port'],
-                                      dbname=conf.infra['psql']['db'])
-    data = {'hash': entry['_id']}
-    clause = f"hash LIKE '{data['hash']}'"
-    psql_data = cmd_psql.get_data(client_psql, 'messages', ['id_message'], clause)
-    if not psql_data:
-        logger.warning("Message %s absent de la base PSQL", data['hash'])
-        return None
-    data['id_message'] = psql_data[0]['id_message']
-
-    clause = f"id_message = {data['id_message']}"
-    if features_ctrl := cmd_psql.get_unique_data(client_psql, 'controle', 'features', clause):
-        logger.debug("Message %s déjà traité pour la partie features - %s", data['hash'],
-                     features_ctrl)
-        return None
-
-    raw_message = entry['message']
-    for fonction in fonctions:
-        data[fonction.__name__] = fonction(raw_message)
-
-    client_psql.close()
+    data = {'hash': entry['_id'], 'id_message': entry['id_message']}
+    data.update(features_texte(entry['message'],
+                               [fonction for fonction in fonctions
+                                if fonction.__name__ in entry['familles']]))
     return data
 
 
+def maj_versions(cli_psql, ids, familles):
+    """
+    Enregistre dans controle la date et la version des familles calculées pour des messages,
+    les versions des autres familles sont conservées
+    :param cli_psql: <psycopg2.extension.connection>
+    :param ids: <list> id_message
+    :param familles: <iterable> tables des familles calculées
+    """
+    versions = json.dumps({famille: FEATURES[famille]['version'] for famille in familles})
+    ids = ','.join(str(id_message) for id_message in ids)
+    cmd_psql.exec_query(cli_psql, f"""UPDATE controle SET features = '{datetime.date.today()}',
+        features_versions = COALESCE(features_versions, '{{}}'::jsonb) || '{versions}'::jsonb
+        WHERE id_message IN ({ids})""")
+
+
 def mise_en_base(result, conf):
     """
-    Mise en base des nouvelles informations
+    Mise en base des nouvelles informations: une requête par table et par paquet, les lignes
+    existantes des familles recalculées sont mises à jour
     """
     logger.info("Mise en base des données statistiques")
     batch_size = 50
@@ -126,67 +132,120 @@ def mise_en_base(result, conf):
                            leave=False,
                            disable=conf.args['progress_bar']):
 
+        tables = {}
+        familles = {}
         for entry in batch:
-            psql_id = entry['id_message']
-            for table in entry:
-                if table in ["hash", "id_message"]:
-                    continue
-                to_insert = {"id_message": psql_id}
-                to_insert.update(entry[table])
-                cmd_psql.insert_data_one(cli_psql, table, to_insert)
-                logger.debug("Data %s insérée dans %s", psql_id, table)
-
-            to_update = {"features": str(datetime.date.today())}
-            cmd_psql.update(cli_psql, 'controle', to_update, clause=f'id_message = {psql_id}')
+            calculees = [table for table in entry if table not in ["hash", "id_message"]]
+            for table in calculees:
+                tables.setdefault(table, []).append(dict(entry[table],
+                                                         id_message=entry['id_message']))
+            familles.setdefault(tuple(calculees), []).append(entry['id_message'])
+
+        for table, lignes in tables.items():
+            cmd_psql.upsert_data_many(cli_psql, table, lignes, ['id_message'])
+        for calculees, ids in familles.items():
+            maj_versions(cli_psql, ids, calculees)
 
         logger.debug("%s documents traités", len(batch))
 
     cli_psql.close()
 
 
-def features_ponctuations(texte):
+class ContexteTexte:
     """
-    Génère les features pour la table de ponctuation: points, virgule, espaces, lignes
+    Données d'un texte partagées par les fonctions de caractéristiques, calculées une seule fois
+    à la première demande.
+    Les caractères recherchés sont tous ascii: ils sont comptés sur l'encodage utf-8 du texte
+    où ils ne font qu'un octet et n'apparaissent dans aucun caractère multi-octets.
+    """
+    def __init__(self, texte):
+        self.texte = texte
+
+    @functools.cached_property
+    def octets(self):
+        """
+        :return: <bytes> texte encodé en utf-8
+        """
+        return self.texte.encode('utf-8', 'surrogatepass')
+
+    @functools.cached_property
+    def tokens(self):
+        """
+        :return: <list> mots du texte
+        """
+        return MOT.findall(self.texte)
+
+    @functools.cached_property
+    def frequences(self):
+        """
+        :return: <Counter> {<str> mot: <int> occurrences}
+        """
+        return Counter(self.tokens)
+
+    def compte(self, caracteres):
+        """
+        Nombre d'occurrences d'un ensemble de caractères ascii
+        :param caracteres: <bytes>
+        :return: <int>
+        """
+        return len(self.octets) - len(self.octets.translate(None, caracteres))
+
+
+def features_texte(texte, fonctions):
+    """
+    Applique les fonctions de caractéristiques à un texte avec un contexte commun
     :param texte: <str>
+    :param fonctions: <list> fonctions de caractéristiques
+    :return: <dict> {<str> nom de la fonction: <dict> caractéristiques}
+    """
+    contexte = ContexteTexte(texte)
+    return {fonction.__name__: fonction(contexte) for fonction in fonctions}
+
+
+def features_ponctuations(contexte):
+    """
+    Génère les features pour la table de ponctuation: points, virgule, espaces, lignes
+    :param contexte: <ContexteTexte>
     :return: <dict>
     """
+    octets = contexte.octets
     return {
-        "point": texte.count('.'),
-        "virgule": texte.count(','),
-        "exclamation": texte.count('!'),
-        "interrogation": texte.count('?'),
-        "tabulation": texte.count('\t'),
-        "espace": texte.count(' '),
-        "ligne": texte.count('\n') + 1,
-        "ligne_vide": len(re.findall(r'^\s*$', texte, re.MULTILINE))
+        "point": octets.count(b'.'),
+        "virgule": octets.count(b','),
+        "exclamation": octets.count(b'!'),
+        "interrogation": octets.count(b'?'),
+        "tabulation": octets.count(b'\t'),
+        "espace": octets.count(b' '),
+        "ligne": octets.count(b'\n') + 1,
+        "ligne_vide": sum(1 for _ in LIGNE_VIDE.finditer(contexte.texte))
     }
 
 
-def features_mots(texte):
+def features_mots(contexte):
     """
     Génère les features pour la table des mots, char non vide
-    :param texte: <str>
+    :param contexte: <ContexteTexte>
     :return: <dict>
     """
-    tokens = re.findall(r'\w+', texte, re.MULTILINE)
+    frequences = contexte.frequences
     return {
-        'char_minuscules': len(re.findall(r'[a-z]', texte, re.MULTILINE)),
-        'char_majuscules': len(re.findall(r'[A-Z]', texte, re.MULTILINE)),
-        'mots': len(tokens),
-        'mots_uniques': len(set(tokens)),
-        'mots_majuscules': sum(mot.isupper() for mot in tokens),
-        'mots_capitalizes': sum(bool(re.match(r'[A-Z][a-z]+', mot)) for mot in tokens)
+        'char_minuscules': contexte.compte(MINUSCULES),
+        'char_majuscules': contexte.compte(MAJUSCULES),
+        'mots': len(contexte.tokens),
+        'mots_uniques': len(frequences),
+        'mots_majuscules': sum(nombre for mot, nombre in frequences.items() if mot.isupper()),
+        'mots_capitalizes': sum(nombre for mot, nombre in frequences.items()
+                                if CAPITALISE.match(mot))
     }
 
 
-def features_zipf(texte):
+def features_zipf(contexte):
     """
     Génère les informations de la distribution de zipf
-    :param texte: <str>
+    :param contexte: <ContexteTexte>
     :return: <dict>
     """
-    tokens = re.findall(r'\w+', texte, re.MULTILINE)
-    z_data = zipf.zipf_process(tokens)
+    z_data = zipf.zipf_frequences(contexte.frequences, resume=True)
     return {
         'constante': float(z_data.get('const_moy')),
         'coefficient': float(z_data.get('coef_min')),
@@ -194,18 +253,223 @@ def features_zipf(texte):
     }
 
 
-def features_hapax(texte):
+def features_hapax(contexte):
     """
     Génère les informations de mots ayant une seule occurrence.
-    :param texte: <str> message
+    :param contexte: <ContexteTexte>
     :return: <dict> avec les données
     """
-    tokens = re.findall(r'\w+', texte, re.MULTILINE)
-    data = zipf.hapax(tokens)
+    data = zipf.hapax_frequences(contexte.frequences, len(contexte.tokens))
     data['nombre_hapax'] = data.pop('nombres')
     return data
 
 
+# Caractéristiques par table: fonction, colonnes produites, données du ContexteTexte utilisées
+# et version. La version d'une famille est à incrémenter quand sa fonction change: l'étape ne
+# recalcule alors que cette famille, pour les seuls messages dont la version en base diffère.
+# Les messages traités avant le suivi des versions sont considérés en version 1.
+# Les alias sont les noms des colonnes dans les jeux d'entraînement (requête train_features)
+FEATURES = {
+    'features_ponctuations': {
+        'fonction': features_ponctuations,
+        'colonnes': ['point', 'virgule', 'exclamation', 'interrogation', 'tabulation', 'espace',
+                     'ligne', 'ligne_vide'],
+        'dependances': ['octets'],
+        'version': 1
+    },
+    'features_mots': {
+        'fonction': features_mots,
+        'colonnes': ['char_minuscules', 'char_majuscules', 'mots', 'mots_uniques',
+                     'mots_majuscules', 'mots_capitalizes'],
+        'dependances': ['octets', 'tokens', 'frequences'],
+        'version': 1
+    },
+    'features_zipf': {
+        'fonction': features_zipf,
+        'colonnes': ['constante', 'coefficient', 'taux_erreur'],
+        'dependances': ['frequences'],
+        'version': 1
+    },
+    'features_hapax': {
+        'fonction': features_hapax,
+        'colonnes': ['ratio_mots_uniques', 'ratio_texte', 'nombre_hapax'],
+        'dependances': ['tokens', 'frequences'],
+        'version': 1
+    }
+}
+ALIAS = {'hapax': 'nombre_hapax', 'hapax_uniques': 'ratio_mots_uniques',
+         'majuscules': 'char_majuscules'}
+CHAMPS_PLAN = planification.CHAMPS_PLAN + ('familles',)
+
+
+def fonctions_requises(colonnes=None):
+    """
+    Fonctions de caractéristiques nécessaires au calcul de colonnes des modèles.
+    Les données du ContexteTexte dont dépend chaque fonction ne sont calculées qu'à la demande.
+    :param colonnes: <iterable> colonnes des modèles, toutes les fonctions si None
+    :return: <list> de <function>
+    """
+    if colonnes is None:
+        return [feature['fonction'] for feature in FEATURES.values()]
+    colonnes = {ALIAS.get(colonne, colonne) for colonne in colonnes}
+    fonctions = [feature['fonction'] for feature in FEATURES.values()
+                 if colonnes.intersection(feature['colonnes'])]
+    logger.debug("Caractéristiques requises: %s", [fonction.__name__ for fonction in fonctions])
+    return fonctions
+
+
+def colonne_modele(colonne):
+    """
+    Nom d'une caractéristique dans les jeux de données des modèles
+    :param colonne: <str>
+    :return: <str>
+    """
+    for alias, nom in ALIAS.items():
+        if colonne == nom:
+            return alias
+    return colonne.lower()
+
+
+def features_lots(conf):
+    """
+    Calcule les caractéristiques de tous les documents par lots en colonnes, y compris des
+    documents déjà traités, et met à jour les tables
+    :param conf: <Settings>
+    """
+    total = planification.compte(conf, 'features_lot')
+    logger.info("Traitement statistique par lots sur %s documents", total)
+    lots = planification.par_lots(planification.documents_a_traiter(conf, 'features_lot'),
+                                  LOT_DOCUMENTS)
+    cli_psql = cmd_psql.connect_db(user=conf.infra['psql']['user'],
+                                   passwd=conf.infra['psql']['pass'],
+                                   host=conf.infra['psql']['host'],
+                                   port=conf.infra['psql']['port'],
+                                   dbname=conf.infra['psql']['db'])
+
+    traites = 0
+    with parallele.Executeur(conf) as executeur:
+        for bloc in executeur.traiter(features_lot, lots, desc="Traitement statistique par lots",
+                                      total=-(-total // LOT_DOCUMENTS) if total else None,
+                                      fenetre=executeur.processus * 2):
+            if bloc and bloc['id_message']:
+                mise_en_base_lot(cli_psql, bloc)
+                traites += len(bloc['id_message'])
+
+    cli_psql.close()
+    logger.info("Caractéristiques de %s documents mises en base", traites)
+
+
+def features_lot(documents):
+    """
+    Calcule les caractéristiques d'un lot de documents: chaque caractéristique est une colonne
+    calculée pour tout le lot par des opérations sur tableaux
+    :param documents: <list> documents mongo à traiter, avec leur id_message
+    :return: <dict> {'id_message': <list>, <str> table: {<str> colonne: <list>}}
+    """
+    contextes = {document['id_message']: ContexteTexte(document['message'])
+                 for document in documents}
+    vides = [id_message for id_message, contexte in contextes.items() if not contexte.tokens]
+    if vides:
+        logger.warning("%s messages sans mot ignorés", len(vides))
+        for id_message in vides:
+            del contextes[id_message]
+
+    bloc = {'id_message': list(contextes)}
+    if not contextes:
+        return bloc
+    contextes = list(contextes.values())
+    bloc.update(colonnes_octets(contextes))
+    bloc['features_ponctuations']['ligne'] += 1
+    bloc['features_ponctuations']['ligne_vide'] = np.array(
+        [sum(1 for _ in LIGNE_VIDE.finditer(contexte.texte)) for contexte in contextes])
+    bloc['features_mots'].update(colonnes_mots(contextes))
+    bloc.update(colonnes_frequences(contextes))
+
+    return {table: {colonne: valeurs.tolist() for colonne, valeurs in colonnes.items()}
+            if isinstance(colonnes, dict) else colonnes for table, colonnes in bloc.items()}
+
+
+def colonnes_octets(contextes):
+    """
+    Compte les caractères ascii de OCTETS: l'histogramme des octets de chaque texte forme une
+    matrice textes x octets dont chaque colonne est la somme des colonnes de ses caractères
+    :param contextes: <list> de <ContexteTexte>
+    :return: <dict> {<str> table: {<str> colonne: <np.ndarray>}}
+    """
+    histogrammes = np.array([np.bincount(np.frombuffer(contexte.octets, dtype=np.uint8),
+                                         minlength=256) for contexte in contextes])
+    return {table: {colonne: histogrammes[:, list(octets)].sum(axis=1)
+                    for colonne, octets in colonnes.items()}
+            for table, colonnes in OCTETS.items()}
+
+
+def colonnes_mots(contextes):
+    """
+    Colonnes de la table des mots. Les mots en majuscules et capitalisés sont recherchés une
+    seule fois dans le vocabulaire du lot puis comptés dans chaque texte par intersection
+    :param contextes: <list> de <ContexteTexte>
+    :return: <dict> {<str> colonne: <np.ndarray>}
+    """
+    vocabulaire = set().union(*(contexte.frequences for contexte in contextes))
+    majuscules = {mot for mot in vocabulaire if mot.isupper()}
+    capitalises = {mot for mot in vocabulaire if CAPITALISE.match(mot)}
+
+    def compte(mots):
+        return np.array([sum(map(contexte.frequences.__getitem__,
+                                 contexte.frequences.keys() & mots))
+                         for contexte in contextes])
+
+    return {
+        'mots': np.array([len(contexte.tokens) for contexte in contextes]),
+        'mots_uniques': np.array([len(contexte.frequences) for contexte in contextes]),
+        'mots_majuscules': compte(majuscules),
+        'mots_capitalizes': compte(capitalises)
+    }
+
+
+def colonnes_frequences(contextes):
+    """
+    Tables zipf et hapax calculées sur les fréquences de tous les textes
+    :param contextes: <list> de <ContexteTexte>
+    :return: <dict> {<str> table: {<str> colonne: <np.ndarray>}}
+    """
+    frequences = [contexte.frequences for contexte in contextes]
+    constantes, coefficients, couts = zipf.zipf_lot(frequences)
+    distincts = np.array([len(freq) for freq in frequences])
+    mots = np.array([len(contexte.tokens) for contexte in contextes])
+    hapax = np.array([list(freq.values()).count(1) for freq in frequences])
+
+    return {
+        'features_zipf': {
+            'constante': constantes,
+            'coefficient': coefficients,
+            'taux_erreur': couts
+        },
+        'features_hapax': {
+            'ratio_mots_uniques': hapax / distincts,
+            'ratio_texte': hapax / mots,
+            'nombre_hapax': hapax
+        }
+    }
+
+
+def mise_en_base_lot(cli_psql, bloc):
+    """
+    Met en base un lot de caractéristiques en colonnes: une requête par table, les lignes
+    existantes sont mises à jour
+    :param cli_psql: <psycopg2.extension.connection>
+    :param bloc: <dict> {'id_message': <list>, <str> table: {<str> colonne: <list>}}
+    """
+    for table, colonnes in bloc.items():
+        if table == 'id_message':
+            continue
+        lignes = [dict(zip(colonnes, valeurs), id_message=id_message)
+                  for id_message, *valeurs in zip(bloc['id_message'], *colonnes.values())]
+        cmd_psql.upsert_data_many(cli_psql, table, lignes, ['id_message'])
+
+    maj_versions(cli_psql, bloc['id_message'], [table for table in bloc if table != 'id_message'])
+
+
 def features_stats(conf):
     """
     Récupère et affiche les données statistiques des caractéristiques
@@ -217,35 +481,37 @@ def features_stats(conf):
                                     host=conf.infra['psql']['host'],
                                     port=conf.infra['psql']['port'],
                                     dbname=conf.infra['psql']['db'])
-    me_cols = ['id_message']
-    ca_cols = ['nom']
     ha_cols = ['ratio_mots_uniques', 'ratio_texte', 'nombre_hapax']
     mo_cols = ['char_minuscules', 'char_majuscules', 'mots', 'mots_uniques', 'mots_majuscules',
                'mots_capitalizes']
     po_cols = ['point', 'virgule', 'exclamation', 'interrogation', 'tabulation', 'espace',
                'ligne', 'ligne_vide']
     zi_cols = ['constante', 'coefficient', 'taux_erreur']
-
-    query = f'''
-    SELECT 
-        {','.join([f'me.{field}' for field in me_cols])}, 
-        {','.join([f'ca.{field}' for field in ca_cols])}, 
-        {','.join([f'ha.{field}' for field in ha_cols])}, 
-        {','.join([f'mo.{field}' for field in mo_cols])}, 
-        {','.join([f'po.{field}' for field in po_cols])}, 
-        {','.join([f'zi.{field}' for field in zi_cols])} 
-    FROM messages me
-    JOIN categories ca ON ca.id_categorie = me.id_categorie 
-    JOIN features_hapax ha ON ha.id_message = me.id_message 
-    JOIN features_mots mo ON mo.id_message = me.id_message 
-    JOIN features_ponctuations po ON po.id_message = me.id_message 
-    JOIN features_zipf zi ON zi.id_message = me.id_message 
-    JOIN controle co ON co.id_message = me.id_message
-    WHERE co.features IS NOT NULL
-    '''
-    full_df = pd.read_sql_query(query, client)
-    replace_cols = {name: name.replace('_', '-') for name in list(full_df.columns)}
-    full_df = full_df.rename(columns=replace_cols)
+    champs = {field.replace('_', '-'): f'{alias}.{field}'
+              for alias, cols in [('ha', ha_cols), ('mo', mo_cols), ('po', po_cols),
+                                  ('zi', zi_cols)]
+              for field in cols}
+
+    # Agrégats calculés par la base, seules les statistiques sont transférées
+    source = '''messages me
+    JOIN categories ca ON ca.id_categorie = me.id_categorie
+    JOIN features_hapax ha ON ha.id_message = me.id_message
+    JOIN features_mots mo ON mo.id_message = me.id_message
+    JOIN features_ponctuations po ON po.id_message = me.id_message
+    JOIN features_zipf zi ON zi.id_message = me.id_message
+    JOIN controle co ON co.id_message = me.id_message'''
+    clause = 'co.features IS NOT NULL'
+    agregats = pd.read_sql_query(cmd_psql.requete_agregats(source, 'ca.nom', champs, clause),
+                                 client)
+
+    correlations = None
+    if conf.args['graph']:
+        excluded = ['ligne-vide', 'tabulation', 'interrogation', 'exclamation', 'virgule',
+                    'mots-majuscules']
+        champs_corr = {nom: champ for nom, champ in champs.items() if nom not in excluded}
+        correlations = graph.matrice_correlations(
+            pd.read_sql_query(cmd_psql.requete_correlations(source, champs_corr, clause), client),
+            list(champs_corr))
     client.dispose()
 
     print_stats = {
@@ -259,11 +525,8 @@ def features_stats(conf):
     }
 
     for categorie, fields in print_stats.items():
-        data = full_df.pivot_table(
-            index='nom',
-            values=fields,
-            aggfunc=['mean', graph.q50, graph.q90, 'max']
-        ).unstack().unstack()
+        data = graph.tableau_agregats(agregats[agregats['champ'].isin(fields)], 'nom',
+                                      sorted(fields))
         latex_data = data.round(2).astype(str)
         latex_data.style.to_latex(
             buf=f'{conf.rapport["features"]}/tab_{categorie}.tex',
@@ -277,8 +540,5 @@ def features_stats(conf):
         )
         logger.info("Statistiques %s\n%s", categorie, data)
 
-    if conf.args['graph']:
-        excluded = ['nom', 'id-message', 'ligne-vide', 'tabulation', 'interrogation',
-                    'exclamation', 'virgule', 'mots-majuscules']
-        df_corr = full_df.drop(excluded, axis=1)
-        graph.feature_correlation(df_corr, conf)
+    if correlations is not None:
+        graph.feature_correlation(correlations, conf)
@@ -4,17 +4,22 @@ Code pour la phase de fouille de données
 """
 import datetime
 import hashlib
+import itertools
 import json
 import logging
-import multiprocessing
+import mmap
+import os
+from collections import Counter
 
-import langdetect
-import tqdm
 import pandas as pd
 from src.modules import cmd_sqlite
 from src.modules import cmd_mongo
 from src.modules import cmd_psql
+from src.modules import empreinte
+from src.modules import esquisse
 from src.modules import importation
+from src.modules import langue
+from src.modules import parallele
 from src.modules import word_count
 from src.modules import nettoyage
 from src.modules import graph
@@ -32,45 +37,250 @@ def main(conf):
     logger.info("Collecte des mails et mise en base")
     databases_init(conf)
 
-    logger.info("Récolte")
-    files_stack = {'ham': [], 'spam': []}
+    logger.info("Récolte, création des documents et mise en base")
+    word_count.init_word_count(conf.args['esquisse'])
+    manifeste = {} if conf.args['force'] else get_manifeste(conf)
+    comptages = []
+    documents = creation_documents(conf, manifeste, comptages)
+    if conf.args['ecriture_directe']:
+        total = bilan_ecriture(documents)
+    else:
+        total = mise_en_base(documents, conf)
+    logger.info("Documents créés - %s", total)
 
+    if conf.args['stats']:
+        comptages.append(word_count.rendre_comptage())
+        # Les fichiers du manifeste ne sont pas relus: seuls les nouveaux sont comptés
+        word_count.store_comptages(word_count.fusion(comptages), conf,
+                                   incrementale=bool(manifeste))
+        get_stats(conf)
+
+    logger.info('Fin du processus de fouille initial')
+
+
+def get_sources(conf, manifeste=None):
+    """
+    Liste paresseusement les sources par catégorie.
+    Chaque dossier (maildir compris), chaque archive et chaque mbox sont lus en parallèle dans
+    des threads séparés.
+    :param conf: <Settings>
+    :param manifeste: <dict> fichiers déjà traités à ignorer
+    :return: <generator> de <tuple> (<dict> source, <str> catégorie)
+    """
+    if manifeste is None:
+        manifeste = {}
+
+    flux = []
     for cat in ['ham', 'spam']:
-        try:
-            for folder in conf.args[cat]:
-                files_stack[cat] += importation.get_files(folder)
-        except TypeError:
+        if not conf.args[cat]:
             logger.warning("%s - aucun dossier donné en argument", cat)
             continue
-    if conf.args['stats']:
-        word_count.fouille_wc(files_stack, conf, 'récolte')
-
-    logger.info("Création des documents")
-    pool_args = [(file, cat) for cat, f_list in files_stack.items() for file in list(f_list)]
-    with multiprocessing.Pool(conf.infra['cpu_available']) as pool:
-        result = list(tqdm.tqdm(pool.imap(fouille_doc, pool_args),
-                                desc="Création des documents",
-                                leave=False,
-                                total=len(pool_args),
-                                disable=conf.args['progress_bar']))
-    result = [doc for doc in result if doc]
-    logger.info("Documents créés - %s", len(result))
 
-    if conf.args['stats']:
-        word_count.fouille_wc(result, conf, 'création')
+        for entree in conf.args[cat]:
+            if importation.is_archive(entree):
+                flux.append(etiqueter(sources_archive(entree, manifeste), cat))
+            elif importation.is_mbox(entree):
+                flux.append(etiqueter(sources_mbox(entree, manifeste), cat))
+            else:
+                flux.append(etiqueter(sources_dossier(entree, manifeste, conf), cat))
 
-    logger.info("Mise en base")
-    mise_en_base(result, conf)
+    return importation.flux_paralleles(flux)
 
-    client = cmd_mongo.connect(conf)
-    db = client[conf.infra['mongo']['db']]
-    collection = db[conf.infra['mongo']['collection']]
-    result = cmd_mongo.get_all_documents(collection, include=['categorie', 'message'])
-    if conf.args['stats']:
-        word_count.fouille_wc(result, conf, 'mise_en_base')
-        get_stats(conf)
 
-    logger.info('Fin du processus de fouille initial')
+def etiqueter(sources, cat):
+    """
+    Associe une catégorie à chaque source
+    :param sources: <iterable>
+    :param cat: <str>
+    :return: <generator> de <tuple>
+    """
+    for source in sources:
+        yield source, cat
+
+
+def creation_documents(conf, manifeste, comptages=None):
+    """
+    Création des documents en flux à partir des fichiers sources.
+    Le nombre de fichiers en vol est borné par IN_FLIGHT, la mémoire reste stable quelle que soit
+    la taille du corpus.
+    En écriture directe chaque processus insère lui-même ses documents et seuls des bilans sont
+    renvoyés, suivis du bilan de fin de chaque processus.
+    Avec les statistiques, les mots de la récolte et de la création sont comptés par les
+    processus au fil du traitement, leurs comptages fusionnés sont ajoutés à la liste.
+    :param conf: <Settings>
+    :param manifeste: <dict> fichiers déjà traités à ignorer, vide pour tout traiter
+    :param comptages: <list> liste à compléter des comptages des processus
+    :return: <generator> de <dict> documents ou bilans
+    """
+    empreintes = None
+    if not conf.args['force']:
+        empreintes = get_empreintes(conf)
+
+    doublons = 0
+    langue.get_modele()
+
+    ecriture = conf.args['ecriture_directe']
+    with parallele.Executeur(conf, initialisation=init_fouille,
+                             initargs=(empreintes, conf.args['max_corps'])) as executeur:
+        for doc in executeur.traiter(fouille_ecriture if ecriture else fouille_doc,
+                                     get_sources(conf, manifeste),
+                                     desc="Création des documents",
+                                     ordonne=False,
+                                     fenetre=IN_FLIGHT):
+            if doc is None:
+                continue
+            doublons += doc.get('doublon', False)
+            yield doc
+
+        executeur.diffuser(importation.fermer_mbox)
+        if ecriture:
+            yield from executeur.diffuser(fin_ecriture)
+
+        if conf.args['stats'] and comptages is not None:
+            comptages.append(word_count.reduction(
+                executeur, executeur.diffuser(word_count.rendre_comptage)))
+
+    logger.info("Doublons écartés avant traitement - %s", doublons)
+
+
+def get_empreintes(conf):
+    """
+    Charge les empreintes des messages connus: hash bruts du manifeste et identifiants de la
+    collection mongo
+    :param conf: <Settings>
+    :return: <Empreintes>
+    """
+    client = cmd_psql.connect_db(user=conf.infra['psql']['user'],
+                                 passwd=conf.infra['psql']['pass'],
+                                 host=conf.infra['psql']['host'],
+                                 port=conf.infra['psql']['port'],
+                                 dbname=conf.infra['psql']['db'])
+    raw_hashes = (ligne[0] for ligne in
+                  cmd_psql.iter_query(client, "SELECT DISTINCT raw_hash FROM manifeste"))
+
+    cli_mongo = cmd_mongo.connect(conf)
+    collection = cli_mongo[conf.infra['mongo']['db']][conf.infra['mongo']['collection']]
+    ids = (doc['_id'] for doc in cmd_mongo.iter_documents(collection, include=['_id'],
+                                                             batch_size=10000))
+
+    empreintes = empreinte.Empreintes(itertools.chain(raw_hashes, ids))
+    client.close()
+    cli_mongo.close()
+    logger.info("Empreintes des messages connus - %s", len(empreintes))
+    return empreintes
+
+
+EMPREINTES = None
+MAX_CORPS = None
+TAMPON = []
+
+
+def init_fouille(empreintes, max_corps=None):
+    """
+    Initialise un processus de création des documents
+    :param empreintes: <Empreintes|None>
+    :param max_corps: <int|None> taille maximale du corps extrait de chaque mail
+    """
+    global EMPREINTES, MAX_CORPS  # pylint: disable=global-statement
+    EMPREINTES = empreintes
+    MAX_CORPS = max_corps
+    word_count.init_word_count(parallele.CONF.args['esquisse'])
+
+
+def get_manifeste(conf):
+    """
+    Récupère le manifeste des fichiers sources déjà traités
+    :param conf: <Settings>
+    :return: <dict> {<str> chemin: (<int> taille, <int> mtime)}
+    """
+    client = cmd_psql.connect_db(user=conf.infra['psql']['user'],
+                                 passwd=conf.infra['psql']['pass'],
+                                 host=conf.infra['psql']['host'],
+                                 port=conf.infra['psql']['port'],
+                                 dbname=conf.infra['psql']['db'])
+    lignes = cmd_psql.get_data(client, 'manifeste', ['chemin', 'taille', 'mtime'])
+    client.close()
+    if lignes == -1:
+        logger.warning("Manifeste des sources indisponible - traitement complet")
+        return {}
+
+    logger.info("Manifeste des sources - %s fichiers connus", len(lignes))
+    return {ligne['chemin']: (ligne['taille'], ligne['mtime']) for ligne in lignes}
+
+
+def sources_dossier(dossier, manifeste, conf):
+    """
+    Parcourt les fichiers d'un dossier en ignorant ceux déjà traités et inchangés depuis le
+    dernier passage
+    :param dossier: <str>
+    :param manifeste: <dict>
+    :param conf: <Settings>
+    :return: <generator> de <dict>
+    """
+    taille_max = conf.args['taille_max']
+    extensions = conf.args['extensions']
+    extensions = tuple(ext.lower() for ext in extensions) if extensions else None
+
+    ignores = 0
+    for chemin, stat in importation.scan_files(os.path.abspath(dossier), taille_max, extensions):
+        if manifeste.get(chemin) == (stat.st_size, stat.st_mtime_ns):
+            ignores += 1
+            continue
+        yield {'chemin': chemin, 'taille': stat.st_size, 'mtime': stat.st_mtime_ns}
+
+    if ignores:
+        logger.info("%s - fichiers inchangés ignorés - %s", dossier, ignores)
+
+
+def sources_archive(archive, manifeste):
+    """
+    Parcourt les fichiers d'une archive en mémoire en ignorant ceux déjà traités.
+    Le chemin d'un membre est noté <archive>::<membre>.
+    :param archive: <str>
+    :param manifeste: <dict>
+    :return: <generator> de <dict>
+    """
+    prefixe = os.path.abspath(archive)
+    ignores = []
+
+    def ignorer(nom, taille, mtime):
+        if manifeste.get(f"{prefixe}::{nom}") == (taille, mtime):
+            ignores.append(nom)
+            return True
+        return False
+
+    logger.info("Lecture de l'archive %s", archive)
+    for nom, taille, mtime, contenu in importation.get_archive_members(archive, ignorer):
+        yield {'chemin': f"{prefixe}::{nom}", 'taille': taille, 'mtime': mtime,
+               'contenu': contenu}
+
+    if ignores:
+        logger.info("Fichiers inchangés ignorés dans %s - %s", archive, len(ignores))
+
+
+def sources_mbox(mbox, manifeste):
+    """
+    Parcourt les messages d'un fichier mbox en ignorant ceux déjà traités.
+    Seules les positions sont transmises aux processus, chacun projette le fichier en mémoire.
+    Le chemin d'un message est noté <mbox>@<début>, un mbox n'étant complété qu'en fin de
+    fichier un message de même position et de même taille est considéré inchangé.
+    :param mbox: <str>
+    :param manifeste: <dict>
+    :return: <generator> de <dict>
+    """
+    chemin = os.path.abspath(mbox)
+    ignores = 0
+
+    logger.info("Indexation du mbox %s", mbox)
+    for debut, fin in importation.index_mbox(chemin):
+        if manifeste.get(f"{chemin}@{debut}") == (fin - debut, 0):
+            ignores += 1
+            continue
+        yield {'chemin': f"{chemin}@{debut}", 'taille': fin - debut, 'mtime': 0,
+               'mbox': chemin, 'debut': debut, 'fin': fin}
+
+    if ignores:
+        logger.info("Messages inchangés ignorés dans %s - %s", mbox, ignores)
 
 
 def databases_init(conf):
@@ -90,55 +300,138 @@ def databases_init(conf):
 
 def fouille_doc(pool_args):
     """
-    Processus de création des documents
+    Processus de création des documents.
+    Un document rejeté ne contient que sa source pour être tout de même inscrit au manifeste.
+    Un message déjà connu est écarté dès la lecture du contenu brut, ou après le nettoyage si
+    seul son hash est connu, et marqué comme doublon.
     :param pool_args: <tuple>
     :return: <dict>
     """
     cat = pool_args[1]
-    file = pool_args[0]
+    source = pool_args[0]
+    file = source['chemin']
+
+    if 'contenu' in source:
+        raw = source.pop('contenu')
+    elif 'mbox' in source:
+        raw = importation.get_mbox_message(source['mbox'], source['debut'], source['fin'])
+    else:
+        raw = importation.map_file(file)
+
+    try:
+        if parallele.CONF.args['stats']:
+            word_count.compter('récolte', cat, word_count.mots_bruts(raw, file))
+        source['raw_hash'] = hashlib.md5(raw).hexdigest()
+        if EMPREINTES is not None and source['raw_hash'] in EMPREINTES:
+            return {'source': source, 'doublon': True}
+        mail, body = importation.load_mail_texte(raw, MAX_CORPS)
+    finally:
+        if isinstance(raw, mmap.mmap):
+            raw.close()
+        elif isinstance(raw, memoryview):
+            raw.release()
 
-    mail = importation.load_mail(file)
     sujet, exp = importation.extract_mail_meta(mail)
-    body = importation.extract_mail_body(mail)
     body, liens = nettoyage.clear_texte_init(body)
 
     if not body:
         logger.warning("Echec de récupération du corps de %s", file)
-        return None
+        return {'source': source}
 
-    try:
-        lang = langdetect.detect(body).split()[0]
-    except langdetect.lang_detect_exception.LangDetectException as err:
-        logger.error("Echec de détection de la langue pour %s %s", file, err)
-        return None
+    body_hash = hashlib.md5(body.encode()).hexdigest()
+    if EMPREINTES is not None and body_hash in EMPREINTES:
+        return {'source': source, 'hash': body_hash, 'doublon': True}
+
+    lang = langue.detecter(body)
+    if lang is None:
+        logger.error("Echec de détection de la langue pour %s", file)
+        return {'source': source}
 
     new_doc = {
-        'hash': hashlib.md5(body.encode()).hexdigest(),
+        'hash': body_hash,
         'categorie': cat.lower(),
         'sujet': sujet if sujet else 'null',
         'expediteur': exp,
         'message': body,
         'langue': lang,
-        'liens': liens
+        'liens': liens,
+        'source': source
     }
 
+    if parallele.CONF.args['stats']:
+        word_count.compter('création', new_doc['categorie'], body.split())
     return new_doc
 
 
+def fouille_ecriture(pool_args):
+    """
+    Processus de création des documents en écriture directe.
+    Le document est conservé dans le tampon du processus, inséré par paquets de CHUNK_SIZE sur
+    ses propres connexions: seul un bilan est renvoyé au processus principal.
+    :param pool_args: <tuple>
+    :return: <dict> {'doublon': <bool>, 'cree': <bool>, 'inseres': <int>}
+    """
+    doc = fouille_doc(pool_args)
+    TAMPON.append(doc)
+
+    bilan = {'doublon': doc.get('doublon', False), 'cree': 'message' in doc, 'inseres': 0}
+    if len(TAMPON) >= CHUNK_SIZE:
+        bilan['inseres'] = ecrire_tampon()
+    return bilan
+
+
+def ecrire_tampon():
+    """
+    Insère le tampon du processus en base sur les connexions du processus puis le vide
+    :return: <int> nombre de documents insérés
+    """
+    conf = parallele.CONF
+    collection = parallele.get_mongo()[conf.infra['mongo']['db']][
+        conf.infra['mongo']['collection']]
+    inseres = insert_chunk(TAMPON, collection, parallele.get_psql())
+    if conf.args['stats']:
+        compter_inseres(TAMPON, inseres)
+    TAMPON.clear()
+    return len(inseres)
+
+
+def fin_ecriture():
+    """
+    Fin de l'écriture directe diffusée une fois par processus: insère le reste du tampon
+    :return: <dict> {'inseres': <int>}
+    """
+    return {'inseres': ecrire_tampon() if TAMPON else 0}
+
+
+def bilan_ecriture(bilans):
+    """
+    Totalise les bilans des processus en écriture directe
+    :param bilans: <iterable> de <dict>
+    :return: <int> nombre de documents créés
+    """
+    total = 0
+    inseres = 0
+    for bilan in bilans:
+        total += bilan.get('cree', False)
+        inseres += bilan['inseres']
+
+    logger.info("Documents insérés par les processus - %s", inseres)
+    return total
+
+
 mongo_fields = ['categorie', 'sujet', 'expediteur', 'message', 'langue']
 psql_fields = ['hash', 'categorie', 'langue']
+IN_FLIGHT = 500
+CHUNK_SIZE = 50
 
 
-def mise_en_base(result, conf):
+def mise_en_base(documents, conf):
     """
-    Mise en base de documents
-    :param result: <list> [<dict>, ...]
+    Mise en base de documents par paquets au fil de leur création
+    :param documents: <iterable> de <dict>
     :param conf: <Settings>
-    :return: <None>
+    :return: <int> nombre de documents créés
     """
-    chunk_size = 50
-    chunked = [result[i:i + chunk_size] for i in range(0, len(result), chunk_size)]
-
     cli_mongo = cmd_mongo.connect(conf)
     db = cli_mongo[conf.infra['mongo']['db']]
     collection = db[conf.infra['mongo']['collection']]
@@ -149,28 +442,100 @@ def mise_en_base(result, conf):
                                    port=conf.infra['psql']['port'],
                                    dbname=conf.infra['psql']['db'])
 
-    for chunk in tqdm.tqdm(chunked,
-                           desc="Mise en base des documents",
-                           leave=False,
-                           disable=conf.args['progress_bar']):
-        mongo_chunk = []
-        psql_chunk = []
-        for doc in chunk:
-            m_entry = {k: v for k, v in doc.items() if k in mongo_fields}
-            m_entry['_id'] = doc['hash']
-            mongo_chunk.append(m_entry)
+    total = 0
+    chunk = []
+    for doc in documents:
+        chunk.append(doc)
+        total += 'message' in doc
+        if len(chunk) >= CHUNK_SIZE:
+            inseres = insert_chunk(chunk, collection, cli_psql)
+            if conf.args['stats']:
+                compter_inseres(chunk, inseres)
+            chunk = []
+
+    if chunk:
+        inseres = insert_chunk(chunk, collection, cli_psql)
+        if conf.args['stats']:
+            compter_inseres(chunk, inseres)
 
-            p_entry = {k: v for k, v in doc.items() if k in psql_fields}
-            p_entry.update(doc['liens'])
-            psql_chunk.append(p_entry)
+    cli_mongo.close()
+    cli_psql.close()
+    return total
 
-        inserted = cmd_mongo.insert_documents(mongo_chunk, collection)
 
-        psql_chunk = {doc['hash']: doc for doc in psql_chunk if doc['hash'] in inserted}
-        psql_insert(psql_chunk, cli_psql)
+def compter_inseres(chunk, inseres):
+    """
+    Compte les mots des documents effectivement insérés pour l'étape mise_en_base
+    :param chunk: <list> [<dict>, ...]
+    :param inseres: <list> hash des documents insérés
+    """
+    restants = set(inseres)
+    for doc in chunk:
+        if doc.get('hash') in restants and 'message' in doc:
+            restants.discard(doc['hash'])
+            word_count.compter('mise_en_base', doc['categorie'], doc['message'].split())
 
-    cli_mongo.close()
-    cli_psql.close()
+
+def insert_chunk(chunk, collection, cli_psql):
+    """
+    Insère un paquet de documents dans mongo puis dans psql et met à jour le manifeste
+    :param chunk: <list> [<dict>, ...]
+    :param collection: <pymongo_Collection>
+    :param cli_psql: <psycopg2.connection>
+    :return: <list> hash des documents insérés
+    """
+    hashes = [doc['hash'] for doc in chunk if 'hash' in doc]
+    documents = [doc for doc in chunk if 'message' in doc]
+    if not documents:
+        presents = set(doc['_id'] for doc in cmd_mongo.get_all_documents(
+            collection, d_filter={'_id': {'$in': hashes}}, include=['_id'])) if hashes else set()
+        manifeste_insert(chunk, presents, cli_psql)
+        return []
+
+    mongo_chunk = []
+    psql_chunk = []
+    for doc in documents:
+        m_entry = {k: v for k, v in doc.items() if k in mongo_fields}
+        m_entry['_id'] = doc['hash']
+        mongo_chunk.append(m_entry)
+
+        p_entry = {k: v for k, v in doc.items() if k in psql_fields}
+        p_entry.update(doc['liens'])
+        psql_chunk.append(p_entry)
+
+    inserted = cmd_mongo.insert_documents(mongo_chunk, collection)
+
+    psql_chunk = {doc['hash']: doc for doc in psql_chunk if doc['hash'] in inserted}
+    psql_insert(psql_chunk, cli_psql)
+
+    presents = set(doc['_id'] for doc in cmd_mongo.get_all_documents(
+        collection, d_filter={'_id': {'$in': hashes}}, include=['_id']))
+    manifeste_insert(chunk, presents, cli_psql)
+    return inserted
+
+
+def manifeste_insert(chunk, presents, cli_psql):
+    """
+    Inscrit les fichiers sources traités dans le manifeste.
+    Un document absent de mongo (échec d'insertion) n'est pas inscrit pour être repris au
+    prochain passage.
+    :param chunk: <list> [<dict>, ...]
+    :param presents: <set> hash présents dans mongo
+    :param cli_psql: <psycopg2.connection>
+    """
+    lignes = {}
+    for doc in chunk:
+        if 'hash' in doc and doc['hash'] not in presents:
+            continue
+        source = doc['source']
+        lignes[source['chemin']] = {'chemin': source['chemin'].replace("'", "''"),
+                                    'taille': source['taille'],
+                                    'mtime': source['mtime'],
+                                    'raw_hash': source['raw_hash'],
+                                    'hash': doc.get('hash')}
+
+    if lignes:
+        cmd_psql.upsert_data_many(cli_psql, 'manifeste', list(lignes.values()), ['chemin'])
 
 
 def get_stats(conf):
@@ -223,19 +588,27 @@ def get_stats(conf):
 def zipf_stats(conf):
     """
     Génère les statistiques en relation avec la distribution de zipf.
+    Les messages sont lus par lots depuis le curseur mongo et leurs mots comptés au fil de
+    l'eau: la mémoire dépend du vocabulaire et non de la taille du corpus. Les rangs et
+    fréquences ne sont conservés que pour le graphique.
     :param conf: <Settings>
     :return: <dict>
     """
     client = cmd_mongo.connect(conf)
     collection = client[conf.infra['mongo']['db']][conf.infra['mongo']['collection']]
-    bag = cmd_mongo.get_all_documents(collection, include='message')
-    bag = [doc['message'].split() for doc in bag]
-    bag = [mot for doc in bag for mot in doc]
+    compteur = esquisse.TopK() if conf.args['esquisse'] else Counter()
+    for doc in cmd_mongo.iter_documents(collection, include=['message']):
+        compteur.update(doc['message'].split())
+    client.close()
+
+    if conf.args['esquisse']:
+        logger.info("Esquisse des fréquences - %s mots - sous-estimation maximale %s",
+                    compteur.total, compteur.ecart)
+        compteur = compteur.frequences()
+    zipf_data = zipf.zipf_frequences(compteur, resume=not conf.args['graph'])
 
-    zipf_data = zipf.zipf_process(bag)
     logger.info("Distribution de zipf\n\tconstante: %.2f\n\tcoefficient k: %.2f",
                 zipf_data['const_moy'], zipf_data['coef_min'])
-    client.close()
     return zipf_data
 
 
@@ -251,21 +624,15 @@ def link_stats(conf):
                                     port=conf.infra['psql']['port'],
                                     dbname=conf.infra['psql']['db'])
 
-    query = '''SELECT
-        c.nom, l.url, l.mail, l.tel, l.nombre, l.prix
-        FROM liens l 
+    champs = {field: f'l.{field}' for field in liens_fields}
+    query = cmd_psql.requete_agregats('''liens l
         JOIN messages m ON l.id_message = m.id_message
-        JOIN categories c ON m.id_categorie = c.id_categorie;
-        '''
+        JOIN categories c ON m.id_categorie = c.id_categorie''', 'c.nom', champs)
 
-    link_data = pd.read_sql_query(query, client)
+    link_data = graph.tableau_agregats(pd.read_sql_query(query, client), 'categorie',
+                                       liens_fields, par_champ=True)
     client.dispose()
 
-    link_data.columns = ['categorie', 'url', 'mail', 'tel', 'nombre', 'prix']
-    aggfunc = ['mean', graph.q50, graph.q90, 'max']
-    link_data = link_data.groupby('categorie')[link_data.columns[1:]].agg(
-        aggfunc).unstack().unstack()
-
     logger.info("Statistiques des liens\n%s", link_data)
 
     if conf.args['rapport']:
@@ -304,7 +671,8 @@ def psql_insert(psql_chunk, client):
     to_insert = [cat for cat in doc_cat if cat not in exists_cat]
 
     if to_insert:
-        cmd_psql.insert_data_many(client, table, [{'nom': cat} for cat in to_insert])
+        # En écriture directe plusieurs processus peuvent insérer la même catégorie
+        cmd_psql.upsert_data_many(client, table, [{'nom': cat} for cat in to_insert], ['nom'])
         exists_cat = {line['nom']: line['id_categorie']
                       for line in cmd_psql.get_data(client, table, ['nom', 'id_categorie'])}
         logger.info('Catégories insérées dans la table %s - %s', table, to_insert)
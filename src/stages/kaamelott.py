@@ -15,7 +15,6 @@ import warnings
 
 import joblib
 import requests
-import langdetect
 import stanza
 import pandas as pd
 from nltk.corpus import stopwords
@@ -25,10 +24,11 @@ from src.modules import cmd_psql
 from src.modules import cmd_mongo
 from src.modules import nettoyage
 from src.modules import importation
+from src.modules import langue
 from src.annexes import zipf
 from src.stages.nlp import lemmatise
 from src.stages.train import normalize
-from src.stages.features import features_ponctuations, features_mots, features_zipf, features_hapax
+from src.stages.features import features_texte, fonctions_requises, colonne_modele
 
 
 logger = logging.getLogger(__name__)
@@ -321,7 +321,7 @@ def attachment_eval(conf, ticket, attached, document):
         logger.info('Aucun nouveau traitement à effectuer pour %s', attached['filename'])
         return
 
-    feats = features_process(document, attached)
+    feats = features_process(document, attached, models)
     bag = nlp_process(conf, document, attached, ticket=ticket)
     vecteur = vecteur_process(conf, bag, document, attached)
     if not vecteur:
@@ -354,14 +354,13 @@ def pre_traitement(conf, ticket, attached):
         attached['result'] = conf.infra['comments']['empty_body'][req_lang]
         return {}
 
-    try:
-        lang = langdetect.detect(body).split()[0]
-        attached['langue'] = lang
-    except langdetect.lang_detect_exception.LangDetectException as err:
-        logger.error("Echec de détection de la langue pour %s %s", attached['filename'], err)
+    lang = langue.detecter(body)
+    if lang is None:
+        logger.error("Echec de détection de la langue pour %s", attached['filename'])
         attached['success'] = False
         attached['result'] = conf.infra['comments']['lang_detect_failed'][req_lang]
         return {}
+    attached['langue'] = lang
 
     document = {
         'hash': hashlib.md5(body.encode()).hexdigest(),
@@ -394,15 +393,7 @@ def ai_eval(models, document, feats, vecteur, attached, **kwargs):
     dataset.update(feats)
     dataset.update(document['liens'])
 
-    for key in list(dataset.keys()):
-        if key == 'nombre_hapax':
-            dataset['hapax'] = dataset.pop(key)
-            continue
-        if key == 'ratio_mots_uniques':
-            dataset['hapax_uniques'] = dataset.pop(key)
-            continue
-        dataset[key.lower()] = dataset.pop(key)
-
+    dataset = {colonne_modele(key): value for key, value in dataset.items()}
     base_df = pd.DataFrame(dataset, index=[0])
     scaler = None
 
@@ -563,18 +554,21 @@ def nlp_process(conf, document, attached, ticket=None):
     return bag
 
 
-def features_process(document, attached=None):
+def features_process(document, attached=None, models=None):
     """
-    Récupération des caractéristiques
+    Récupération des caractéristiques utilisées par les modèles
     :param document: <dict>
     :param attached: <dict>
+    :param models: <list> modèles à évaluer, toutes les caractéristiques si None
     :return: <dict>
     """
     logger.info("%s - Recherche des caractéristiques (%s)", document['hash'],
                 attached['filename'] if attached else 'direct mail')
     feats = {}
-    for fonction in [features_ponctuations, features_mots, features_zipf, features_hapax]:
-        feats.update(fonction(document['message']))
+    fonctions = fonctions_requises(None if models is None else
+                                   [colonne for model in models for colonne in model['colonnes']])
+    for table in features_texte(document['message'], fonctions).values():
+        feats.update(table)
     return feats
 
 
@@ -14,12 +14,14 @@ import tqdm
 import pandas as pd
 
 from nltk.corpus import stopwords
-from src.modules import cmd_mongo
 from src.modules import cmd_psql
+from src.modules import planification
 from src.annexes import zipf
 
 logger = logging.getLogger(__name__)
 
+LOTS_TRI = 16
+
 
 def main(conf):
     """
@@ -52,42 +54,30 @@ def main(conf):
     logger.info("Fin du processus NLP")
 
 
-def get_all_mails(conf):
-    """
-    Récupère tous les mails de la base mongo.
-    :param conf: <Settings>
-    :return: <list> of dict
-    """
-    documents = []
-    for arg_collection in conf.infra['mongo']['collection']:
-        logger.info("Récupération des documents dans %s", arg_collection)
-        client = cmd_mongo.connect(conf)
-        collection = client[conf.infra['mongo']['db']][arg_collection]
-        documents += cmd_mongo.get_all_documents(collection,
-                                                 d_filter={'langue': conf.args['langue']},
-                                                 include=['_id', 'message'])
-        client.close()
-
-    return documents
-
-
 def process_pipeline(conf, stz_pipe, pattern, stopw):
     """
-    Fonction executé dans un processus séparé
+    Fonction executé dans un processus séparé.
+    Les documents sont envoyés à stanza par lots: chaque fenêtre de LOTS_TRI lots est triée par
+    longueur de message pour que les documents d'un même appel soient de tailles proches.
     :param conf: <Settings>
     :param stz_pipe: <stanza.Pipeline>
     :param pattern: <re.compile>
     :param stopw: <set>
     """
     results = []
-    logger.info("Début du processus traitement nlp")
-    for document in tqdm.tqdm(get_all_mails(conf),
-                              desc="Traitement NLP",
-                              leave=False,
-                              disable=conf.args['progress_bar']):
-        data = nlp_pipeline(conf, document, stz_pipe, pattern, stopw)
-        if data:
-            results.append(data)
+    total = planification.compte(conf, 'nlp')
+    taille = conf.args['taille_lot']
+    logger.info("Début du processus traitement nlp - %s documents - lots de %s", total, taille)
+    with tqdm.tqdm(desc="Traitement NLP",
+                   total=total,
+                   leave=False,
+                   disable=conf.args['progress_bar']) as progression:
+        for fenetre in planification.par_lots(planification.documents_a_traiter(conf, 'nlp'),
+                                              taille * LOTS_TRI):
+            fenetre.sort(key=lambda document: len(document['message'] or ''))
+            for lot in planification.par_lots(fenetre, taille):
+                results.extend(nlp_lot(lot, stz_pipe, pattern, stopw))
+                progression.update(len(lot))
 
     logger.info("Fin du traitement nlp")
     return results
@@ -149,40 +139,42 @@ def insert_pipeline(conf, documents):
     logger.info("Fin de la mise en base")
 
 
-def nlp_pipeline(conf, document, stz_pipe, pattern, stopw):
+def nlp_lot(documents, stz_pipe, pattern, stopw):
+    """
+    Traitement d'un lot de messages en un appel à stanza. En cas d'erreur le lot est traité
+    message par message pour n'écarter que les messages en erreur.
+    :param documents: <list> documents mongo à traiter, avec leur id_message et leur catégorie
+    :param stz_pipe: <stanza.pipeline>
+    :param pattern: <re.compile>
+    :param stopw: <set>
+    :return: <list> de <dict>
+    """
+    if len(documents) == 1:
+        return [nlp_pipeline(documents[0], stz_pipe, pattern, stopw)]
+
+    try:
+        bags = lemmatise_lot([document['message'] for document in documents], stopw, stz_pipe,
+                             pattern)
+    except (TypeError, torch.cuda.OutOfMemoryError) as err:
+        logger.debug("Erreur de traitement d'un lot de %s messages, traitement un à un - %s",
+                     len(documents), err)
+        return [nlp_pipeline(document, stz_pipe, pattern, stopw) for document in documents]
+
+    return [{'id_message': document['id_message'], 'categorie': document['categorie'],
+             'nlp': str(datetime.date.today()), 'nlp_status': 'OK', 'bag': zipf.freq_mot(bag)}
+            for document, bag in zip(documents, bags)]
+
+
+def nlp_pipeline(document, stz_pipe, pattern, stopw):
     """
     Pipeline du traitement pour un message
-    :param conf: <Settings>
-    :param document: <dict>
+    :param document: <dict> document mongo à traiter, avec son id_message et sa catégorie
     :param stz_pipe: <stanza.pipeline>
     :param pattern: <re.compile>
     :param stopw: <set>
     :return: <dict>
     """
-    client_psql = cmd_psql.connect_db(user=conf.infra['psql']['user'],
-                                      passwd=conf.infra['psql']['pass'],
-                                      host=conf.infra['psql']['host'],
-                                      port=conf.infra['psql']['port'],
-                                      dbname=conf.infra['psql']['db'])
-    clause = f"hash LIKE '{document['_id']}'"
-    psql_data = cmd_psql.get_data(client_psql, 'messages', ['id_message'], clause)
-    if not psql_data:
-        logger.warning("Message %s absent de la base PSQL", document['_id'])
-        return None
-    data = {'id_message': psql_data[0]['id_message']}
-
-    clause = f"id_message = {data['id_message']}"
-    if nlp_ctrl := cmd_psql.get_unique_data(client_psql, 'controle', 'nlp', clause):
-        logger.debug("Message %s déjà traité pour la partie nlp - %s", document['_id'],
-                     nlp_ctrl)
-        return None
-
-    query = (f"SELECT c.nom as categorie FROM messages m "
-             f"JOIN categories c ON m.id_categorie = c.id_categorie "
-             f"WHERE m.id_message = {data['id_message']};")
-    data['categorie'] = cmd_psql.exec_query(client_psql, query)[0][0]
-    client_psql.close()
-
+    data = {'id_message': document['id_message'], 'categorie': document['categorie']}
     data.update({'nlp': str(datetime.date.today()), 'nlp_status': 'OK'})
     try:
         data.update({
@@ -208,7 +200,31 @@ def lemmatise(message, stopwds, pipeline, pattern):
     :param pattern: <re.compile>
     :return: <list> message lemmatisé sous forme de liste de mot
     """
-    doc = pipeline(message)
+    return filtre_lemmes(pipeline(message), stopwds, pattern)
+
+
+def lemmatise_lot(messages, stopwds, pipeline, pattern):
+    """
+    Lemmatise plusieurs textes en un seul appel au pipeline, stanza regroupant les phrases de
+    tous les textes dans ses propres lots
+    :param messages: <list> de <str>
+    :param stopwds: <list> liste des stopwords
+    :param pipeline: <stanza.Pipeline> Pipeline nlp
+    :param pattern: <re.compile>
+    :return: <list> messages lemmatisés, dans l'ordre des messages
+    """
+    docs = pipeline([stanza.Document([], text=message) for message in messages])
+    return [filtre_lemmes(doc, stopwds, pattern) for doc in docs]
+
+
+def filtre_lemmes(doc, stopwds, pattern):
+    """
+    Retire les ponctuations et les stopwords des lemmes d'un document stanza
+    :param doc: <stanza.Document>
+    :param stopwds: <list> liste des stopwords
+    :param pattern: <re.compile>
+    :return: <list> de mots
+    """
     lemma = [mot.lemma for phrase in doc.sentences for mot in phrase.words]
     return [lem.lower() for lem in lemma if re.match(pattern, lem) and lem.lower() not in stopwds]
 
@@ -3,19 +3,24 @@
 Code pour la phase de recherche de vectorisation
 """
 import datetime
+import functools
 import json
 import math
 import logging
 import sys
-import multiprocessing
 import tqdm
 
+import numpy as np
 import pandas as pd
 from src.modules import cmd_psql
 from src.modules import graph
+from src.modules import parallele
+from src.modules import planification
 
 logger = logging.getLogger(__name__)
 
+CLASSES_HISTOGRAMME = 70
+
 
 def main(conf):
     """
@@ -112,28 +117,15 @@ def tfidf_vect_full(conf):
              f"WHERE co.nlp_status LIKE 'OK' "
              f"AND me.langue LIKE '{conf.args['langue']}'")
     total_docs = cmd_psql.exec_query(client, query)[0][0]
-
-    query = (f"SELECT co.id_message FROM controle co "
-             f"JOIN messages me ON co.id_message = me.id_message "
-             f"WHERE co.vect_tfidf IS NULL "
-             f"AND me.langue LIKE '{conf.args['langue']}'")
-    ctrl_docs = cmd_psql.exec_query(client, query)
-    if ctrl_docs == -1:
-        logger.error("Echec de recherche des documents à traité")
-        return
-
-    to_process = [entry[0] for entry in ctrl_docs]
     client.close()
 
+    to_process = [id_message for _, id_message, _ in planification.plan(conf, 'vecteurs')]
+
     logger.info("Vectorisation TFIDF %s documents à traiter", len(to_process))
-    pool_args = [(conf, total_docs, id_message) for id_message in to_process]
-    with multiprocessing.Pool(conf.infra['cpu_available']) as pool:
-        result = list(tqdm.tqdm(pool.imap(tfidf_vectorise, pool_args),
-                                desc="Vectorisation TFIDF",
-                                leave=False,
-                                total=len(pool_args),
-                                disable=conf.args['progress_bar']))
-    result = [doc for doc in result if doc]
+    with parallele.Executeur(conf) as executeur:
+        result = [doc for doc in executeur.traiter(
+            functools.partial(tfidf_vectorise, total_docs), to_process,
+            desc="Vectorisation TFIDF") if doc]
     logger.info('%s documents vectorisés', len(result))
 
     tfidf_store_vecteurs(conf, result)
@@ -142,21 +134,14 @@ def tfidf_vect_full(conf):
         tfidf_graph(conf)
 
 
-def tfidf_vectorise(pool_args):
+def tfidf_vectorise(total_docs, id_message):
     """
     Vectorise un message
-    :param pool_args: <tuple>
-    :return: <list>
+    :param total_docs: <int> nombre de documents du corpus
+    :param id_message: <int>
+    :return: <dict>
     """
-    conf = pool_args[0]
-    total_docs = pool_args[1]
-    id_message = pool_args[2]
-
-    client = cmd_psql.connect_db(user=conf.infra['psql']['user'],
-                                 passwd=conf.infra['psql']['pass'],
-                                 host=conf.infra['psql']['host'],
-                                 port=conf.infra['psql']['port'],
-                                 dbname=conf.infra['psql']['db'])
+    client = parallele.get_psql()
 
     query = (f"SELECT vt.label, nd.occurrence, nc.freq_documents "
              f"FROM nlp_mots_documents nd "
@@ -189,7 +174,6 @@ def tfidf_vectorise(pool_args):
             }
         )
 
-    client.close()
     return data
 
 
@@ -238,11 +222,26 @@ def tfidf_graph(conf):
         sql_reqs = json.load(file)
 
     queries = sql_reqs["tfidf_data"]
-    df_1 = pd.read_sql_query(queries[0].format(langue=conf.args['langue']), client)
-    df_1 = df_1.drop(['document'], axis=1)
+    # Histogrammes calculés par la base: seuls les effectifs par classe sont transférés
+    histogrammes = {}
+    for champ, limite in [('dimensions', 200), ('somme', 1000)]:
+        source = f"(SELECT * FROM ({queries[0].format(langue=conf.args['langue'])}) AS tfidf " \
+                 f"WHERE {champ} <= {limite}) AS filtre"
+        minimum, maximum = pd.read_sql_query(
+            f"SELECT MIN({champ})::float8, MAX({champ})::float8 FROM {source}", client).iloc[0]
+        if pd.isna(minimum):
+            continue
+        if minimum == maximum:
+            minimum, maximum = minimum - 0.5, maximum + 0.5
+        data = pd.read_sql_query(
+            cmd_psql.requete_histogramme(source, champ, 'categorie', (minimum, maximum),
+                                         CLASSES_HISTOGRAMME), client)
+        bornes = np.linspace(minimum, maximum, CLASSES_HISTOGRAMME + 1)
+        data[champ] = (bornes[:-1] + bornes[1:])[data['classe'] - 1] / 2
+        histogrammes[champ] = (data.rename(columns={'groupe': 'categorie'}), bornes)
 
     df_2 = pd.read_sql_query(queries[1].format(langue=conf.args['langue']), client)
     df_2 = df_2.drop(['label'], axis=1)
-    graph.vecteurs_dash(df_1, df_2, conf)
+    graph.vecteurs_dash(histogrammes, df_2, conf)
 
     client.dispose()
@@ -0,0 +1,64 @@
+# coding: utf-8
+"""
+Tests du module d'importation
+"""
+
+import hashlib
+import mailbox
+import os
+import tempfile
+import unittest
+
+from src.modules import importation
+
+MESSAGES = [
+    b"From: a@exemple.fr\nSubject: premier\n\nBonjour,\nun premier message.\n",
+    b"From: b@exemple.fr\nSubject: second\nContent-Type: text/plain; charset=utf-8\n\n"
+    b"Un second message \xc3\xa9t\xc3\xa9 sur\nplusieurs lignes.\n\n\n",
+    b"From: c@exemple.fr\r\nSubject: crlf\r\n\r\nUn message CRLF.\r\n",
+]
+
+
+class TestMbox(unittest.TestCase):
+    """
+    Lecture des messages d'un mbox
+    """
+    def setUp(self):
+        self.dossier = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.mbox = os.path.join(self.dossier.name, 'boite.mbox')
+        boite = mailbox.mbox(self.mbox)
+        for message in MESSAGES:
+            boite.add(message)
+        boite.close()
+
+    def tearDown(self):
+        importation.fermer_mbox()
+        self.dossier.cleanup()
+
+    def test_mbox_identique_fichier(self):
+        """
+        Un message lu dans un mbox est identique au même message enregistré dans un fichier
+        """
+        positions = list(importation.index_mbox(self.mbox))
+        self.assertEqual(len(positions), len(MESSAGES))
+
+        for numero, ((debut, fin), message) in enumerate(zip(positions, MESSAGES)):
+            fichier = os.path.join(self.dossier.name, f'{numero}.eml')
+            with open(fichier, 'wb') as f_bin:
+                f_bin.write(message)
+
+            contenu = importation.get_mbox_message(self.mbox, debut, fin)
+            brut = importation.map_file(fichier)
+            try:
+                self.assertEqual(bytes(contenu), bytes(brut))
+                self.assertEqual(hashlib.md5(contenu).hexdigest(),
+                                 hashlib.md5(brut).hexdigest())
+                self.assertEqual(importation.load_mail_texte(contenu)[1],
+                                 importation.load_mail_texte(brut)[1])
+            finally:
+                contenu.release()
+                brut.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
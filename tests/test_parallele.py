@@ -0,0 +1,74 @@
+# coding: utf-8
+"""
+Tests du module d'exécution parallèle
+"""
+
+import signal
+import types
+import unittest
+
+from src.modules import parallele
+
+DELAI = 30
+
+
+def double(tache):
+    """
+    Tâche de test
+    :param tache: <int>
+    :return: <int>
+    """
+    return tache * 2
+
+
+def delai_depasse(*_):
+    """
+    Interrompt un test bloqué
+    """
+    raise TimeoutError(f"Traitement bloqué plus de {DELAI}s")
+
+
+class TestFluxBorne(unittest.TestCase):
+    """
+    Arrêt d'un flux borné en cours de route
+    """
+    def setUp(self):
+        self.conf = types.SimpleNamespace(infra={'cpu_available': 2},
+                                          args={'progress_bar': True})
+        signal.signal(signal.SIGALRM, delai_depasse)
+        signal.alarm(DELAI)
+
+    def tearDown(self):
+        signal.alarm(0)
+
+    def test_erreur_consommateur(self):
+        """
+        L'erreur du consommateur remonte alors que la fenêtre est pleine
+        """
+        with self.assertRaises(ValueError):
+            with parallele.Executeur(self.conf) as executeur:
+                for numero, _ in enumerate(executeur.traiter(double, iter(range(1000)), 'test',
+                                                             fenetre=20)):
+                    if numero == 5:
+                        raise ValueError("consommateur")
+
+    def test_flux_abandonne(self):
+        """
+        Un flux abandonné fenêtre pleine ne bloque pas la fermeture du pool
+        """
+        with parallele.Executeur(self.conf) as executeur:
+            flux = executeur.traiter(double, iter(range(1000)), 'test', fenetre=20)
+            self.assertEqual(next(flux), 0)
+        flux.close()
+
+    def test_flux_complet(self):
+        """
+        Un flux borné consommé entièrement renvoie tous les résultats
+        """
+        with parallele.Executeur(self.conf) as executeur:
+            resultats = list(executeur.traiter(double, iter(range(1000)), 'test', fenetre=20))
+        self.assertEqual(resultats, [tache * 2 for tache in range(1000)])
+
+
+if __name__ == '__main__':
+    unittest.main()